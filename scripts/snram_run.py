@@ -20,7 +20,21 @@ def _parse_args():
                         action="store",
                         dest="xlsx_file",
                         required=True,
-                        help="name of Excel file with topology (xlsx)")
+                        help="name of Excel file with topology (xlsx), "
+                        "or CSV/TSV file with links")
+    parser.add_argument("--nodes",
+                        action="store",
+                        dest="nodes_file",
+                        default=None,
+                        required=False,
+                        help="name of CSV/TSV file with nodes")
+    parser.add_argument("--od",
+                        action="store",
+                        dest="od_file",
+                        default=None,
+                        required=False,
+                        help="name of CSV file with OD matrix for max-flow "
+                        "interdiction (run od)")
     parser.add_argument("-s", "--save",
                         action="store",
                         dest="save_xlsx",
@@ -37,7 +51,8 @@ def _parse_args():
                         action="store",
                         dest="run_type",
                         choices=["critical_asset", "prepare", "mitigate",
-                                 "threat", "stackelberg", "interdict"],
+                                 "threat", "stackelberg", "interdict",
+                                 "criticality", "gap", "od"],
                         default="critical_asset",
                         required=False,
                         help="type of simulation run")
@@ -65,7 +80,9 @@ def _parse_args():
     parser.add_argument("-o", "--solver",
                         action="store",
                         dest="solver",
-                        choices=["cplex", "glpk", "ipopt"],
+                        choices=["cplex", "glpk", "ipopt", "scipy",
+                                 "combinatorial", "decomposition",
+                                 "greedy"],
                         default="cplex",
                         required=False,
                         help="solver")
@@ -76,6 +93,64 @@ def _parse_args():
                         type=int,
                         required=False,
                         help="maximum number of iterations")
+    parser.add_argument("--samples",
+                        action="store",
+                        dest="samples",
+                        default=None,
+                        type=int,
+                        required=False,
+                        help="number of sampled nodes for link betweenness")
+    parser.add_argument("--seed",
+                        action="store",
+                        dest="seed",
+                        default=None,
+                        type=int,
+                        required=False,
+                        help="seed for sampling of nodes")
+    parser.add_argument("-w", "--workers",
+                        action="store",
+                        dest="workers",
+                        default=None,
+                        type=int,
+                        required=False,
+                        help="number of worker processes")
+    parser.add_argument("--warmstart",
+                        action="store_true",
+                        required=False,
+                        help="warm start interdiction from previous attacks")
+    parser.add_argument("--native-primal",
+                        action="store_true",
+                        dest="native_primal",
+                        required=False,
+                        help="compute flows after interdiction natively")
+    parser.add_argument("--time-limit",
+                        action="store",
+                        dest="time_limit",
+                        default=None,
+                        type=float,
+                        required=False,
+                        help="time limit of each interdiction solve in s")
+    parser.add_argument("--mip-gap",
+                        action="store",
+                        dest="mip_gap",
+                        default=None,
+                        type=float,
+                        required=False,
+                        help="relative MIP gap of interdiction solves")
+    parser.add_argument("-c", "--cache",
+                        action="store",
+                        dest="cache_dir",
+                        default=None,
+                        required=False,
+                        help="directory for caching parsed topologies "
+                             "and interdiction solutions")
+    parser.add_argument("--cache-size",
+                        action="store",
+                        dest="cache_size",
+                        default=1024,
+                        type=float,
+                        required=False,
+                        help="size limit of solution cache in MB")
     parser.add_argument("-v", "--verbose",
                         action="store_true",
                         required=False,
@@ -94,4 +169,15 @@ if __name__ == "__main__":
            attacks=args.attacks,
            solver=args.solver,
            max_iter=args.max_iter,
+           cache_dir=args.cache_dir,
+           cache_size=args.cache_size,
+           nodes_file=args.nodes_file,
+           od_file=args.od_file,
+           samples=args.samples,
+           seed=args.seed,
+           workers=args.workers,
+           warmstart=args.warmstart,
+           native_primal=args.native_primal,
+           time_limit=args.time_limit,
+           mip_gap=args.mip_gap,
            tee=args.verbose)
@@ -0,0 +1,103 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides asynchronous solves of interdiction problems in subprocesses."""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+from snram.solution_cache import solution_state
+
+
+def _solve(conn, create, args, stream):
+    # Create the interdiction model as create(*args), solve the interdiction
+    # problem and send the incumbents and solution to the parent. The
+    # subprocess leads a new process group, so that the solvers it starts
+    # are terminated with it.
+    if hasattr(os, "setsid"):
+        os.setsid()
+    try:
+        model = create(*args)
+        if stream:
+            model.set_callback(
+                lambda record: conn.send(("incumbent", record)))
+        primal, idual = model.solve()
+        conn.send(("solution", solution_state(primal, idual),
+                   model.solve_time))
+    except Exception as exc:  # pylint: disable=broad-except
+        conn.send(("error", exc))
+    conn.close()
+
+
+async def _receive(conn, callback):
+    # Receive messages until the solution, passing incumbents to the
+    # callback. The event loop wakes this up when the pipe is readable.
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(conn.fileno(), readable.set)
+    try:
+        while True:
+            await readable.wait()
+            readable.clear()
+            while conn.poll():
+                message = conn.recv()
+                if message[0] != "incumbent":
+                    return message
+                callback(message[1])
+    finally:
+        loop.remove_reader(conn.fileno())
+
+
+def _terminate(process):
+    # Terminate the subprocess and the solvers it started.
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except (AttributeError, OSError):  # no process group (yet)
+        process.terminate()
+    process.join(1.0)
+    if process.is_alive():
+        process.kill()
+        process.join()
+
+
+async def solve_in_subprocess(create, args, callback=None, timeout=None,
+                              context=None):
+    """Solve interdiction model in a subprocess.
+
+    The model is created in the subprocess as create(*args), so that only
+    the topology and arguments are pickled (Pyomo models cannot be pickled
+    for the spawn start method). Returns the solution state of the primal
+    and dual models (see solution_state()) and the solve time. Incumbents
+    found in the subprocess are passed to the callback in this process. If
+    the solve is cancelled or takes more than timeout seconds
+    (asyncio.TimeoutError), the subprocess and the solvers it started are
+    terminated. The subprocess is started with the multiprocessing context
+    given, or the default one.
+    """
+    if context is None:
+        context = multiprocessing.get_context()
+    conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(
+        target=_solve, args=(child_conn, create, args, callback is not None),
+        daemon=True)
+    process.start()
+    child_conn.close()
+    try:
+        message = await asyncio.wait_for(_receive(conn, callback), timeout)
+    except EOFError:
+        process.join()
+        raise RuntimeError("interdiction subprocess exited with code %s"
+                           % process.exitcode) from None
+    except BaseException:
+        _terminate(process)
+        raise
+    finally:
+        conn.close()
+    process.join()
+    if message[0] == "error":
+        raise message[1]
+    return message[1], message[2]
@@ -6,8 +6,10 @@
 
 """Provides an attacker model."""
 
+import heapq
 from copy import deepcopy
 from itertools import count
+import numpy as np
 from snram.topology import NetworkTopology
 from snram.network_risk import NetworkRisk
 from snram.risk_score import THREAT_MAX, THREAT_INC
@@ -16,7 +18,7 @@ from snram.risk_score import THREAT_MAX, THREAT_INC
 class Attacker:
     """Class providing attacker model."""
 
-    def __init__(self, network_risk, budget=1):
+    def __init__(self, network_risk, budget=1, incremental=True):
         self.network_risk = None
         if isinstance(network_risk, NetworkRisk):
             self.network_risk = network_risk
@@ -27,6 +29,7 @@ class Attacker:
         else:
             raise AttributeError("unknown topology provided")
         self.budget = budget
+        self.incremental = incremental
 
     def _increase_asset_threat(self, asset):
         # Increase threat for the asset that gives largest relative increase
@@ -57,16 +60,8 @@ class Attacker:
                 idx = i
                 delta_risk_max = delta_risk
         threat_new[idx] = threat_tmp[idx]
-        # Ugly hack:
-        # Need to store returned result in res before set_threat() is called.
-        # Otherwise threat_old[indx] == threat_new[indx], which is strange ...
-        # It would be more elegant to do:
-        #   return (indx, threat_old[indx], threat_new[indx])
-        # after calling set_threat().
-        # TODO: Should look more into what is causing this behaviour.
-        res = (idx, threat_old[idx], threat_new[idx])
         self.network_risk.set_threat(asset, threat_new)
-        return res
+        return (idx, threat_old[idx], threat_new[idx])
 
     def _find_attackable_assets(self, asset):
         # Find attackable assets and attack weights from threat x vulnerability:
@@ -74,20 +69,77 @@ class Attacker:
         threat = self.network_risk.get_threat(asset)
         vuln = self.network_risk.get_vulnerability(asset)
         threat_vuln = threat * vuln
-        attackable_assets = []
-        attack_weights = []
+        attackable = self.network_risk.get_attackable(asset)
         asset_data = self.network_risk.topology.node_data
         if asset == "links":
             asset_data = self.network_risk.topology.link_data
-        for idx, row in asset_data.iterrows():
-            if row["attackable"] == 1:
-                attackable_assets.append(idx)
-                attack_weights.append(threat_vuln[idx])
+        attackable_assets = list(asset_data.index[attackable == 1])
+        attack_weights = list(threat_vuln[attackable == 1])
         return (attackable_assets, attack_weights)
 
+    def _threat_gain_heap(self, threat, vuln, cons, risk):
+        # Build max-heap of (relative risk increase, index) for all assets.
+        # Gains are negated since heapq is a min-heap; ties are broken on
+        # the lowest index.
+        threat_inc = np.minimum(threat + THREAT_INC, THREAT_MAX)
+        risk_inc = self.network_risk.compute_risk(threat_inc, vuln, cons)
+        gain = (risk_inc - risk) / risk
+        heap = list(zip((-gain).tolist(), range(len(gain))))
+        heapq.heapify(heap)
+        return heap
+
+    def _maximise_threat_incremental(self, asset):
+        # Greedy threat maximisation with a priority queue of marginal gains.
+        #
+        # Increasing the threat of one asset only changes the relative risk
+        # increase of that asset, hence only its heap entry is updated. This
+        # gives the same choices as _increase_asset_threat().
+        threat = self.network_risk.get_threat(asset)
+        vuln = self.network_risk.get_vulnerability(asset)
+        cons = self.network_risk.get_consequence(asset)
+        risk = self.network_risk.get_risk(asset)
+        weight = vuln.astype(np.int64) * cons
+
+        # Risk given with the topology may differ from T x V x C; it is only
+        # used for the first step as set_threat() recomputes all risks.
+        consistent = np.array_equal(
+            risk, self.network_risk.compute_risk(threat, vuln, cons))
+
+        heap = self._threat_gain_heap(threat, vuln, cons, risk)
+        risk_sum = 0
+        res = []
+        for it in range(self.budget):
+            gain, top = heap[0]
+            idx = top if -gain > 0 else 0
+            threat_old = threat[idx]
+            threat[idx] = min(threat_old + THREAT_INC, THREAT_MAX)
+            if it == 0:
+                risk_sum = int(self.network_risk.compute_risk(
+                    threat, vuln, cons).sum())
+            else:
+                risk_sum += int(threat[idx] - threat_old) * int(weight[idx])
+            res.append([idx, threat_old, threat[idx], risk_sum])
+
+            if not consistent or (idx != top and threat[idx] != threat_old):
+                consistent = True
+                heap = self._threat_gain_heap(
+                    threat, vuln, cons,
+                    self.network_risk.compute_risk(threat, vuln, cons))
+            elif idx == top:
+                r_old = int(threat[idx]) * int(weight[idx])
+                r_new = min(int(threat[idx]) + THREAT_INC,
+                            THREAT_MAX) * int(weight[idx])
+                heapq.heapreplace(heap, (-((r_new - r_old) / r_old), idx))
+        self.network_risk.set_threat(asset, threat)
+        return res
+
     def maximise_threat(self, asset):
         """Maximise threat for given asset given budget constraint."""
         assert asset == "nodes" or asset == "links"
+        if self.incremental:
+            res = self._maximise_threat_incremental(asset)
+            self.network_risk.sync()
+            return (res, self.network_risk.topology)
         res = []
         for _ in range(self.budget):
             # Increase threat for given asset:
@@ -96,6 +148,7 @@ class Attacker:
             # Compute sum of risks:
             risk_sum = self.network_risk.get_risk(asset).sum()
             res.append([idx, threat_old, threat_new, risk_sum])
+        self.network_risk.sync()
         return (res, self.network_risk.topology)
 
     def threat(self):
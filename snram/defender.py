@@ -6,6 +6,8 @@
 
 """Provides a defender model."""
 
+import heapq
+import numpy as np
 from snram.topology import NetworkTopology
 from snram.network_risk import NetworkRisk
 from snram.risk_score import VULN_MIN, VULN_INC, CONS_MIN, CONS_INC
@@ -14,7 +16,7 @@ from snram.risk_score import VULN_MIN, VULN_INC, CONS_MIN, CONS_INC
 class Defender:
     """Class providing defender model."""
 
-    def __init__(self, network_risk, budget=1):
+    def __init__(self, network_risk, budget=1, incremental=True):
         self.network_risk = None
         if isinstance(network_risk, NetworkRisk):
             self.network_risk = network_risk
@@ -25,16 +27,18 @@ class Defender:
         else:
             raise AttributeError("unknown topology provided")
         self.budget = budget
+        self.incremental = incremental
+
+    def _asset_label(self, asset, idx):
+        # Return node name or link tuple for the asset at position idx.
+        if asset == "nodes":
+            return self.network_risk.topology.node_data.index[idx]
+        return self.network_risk.topology.link_data.index[idx]
 
     def _reduce_asset_vulnerability(self, asset):
         # Reduce vulnerability for the most critical asset.
-        asset_data = None
-        if asset == "nodes":
-            asset_data = self.network_risk.topology.node_data
-        elif asset == "links":
-            asset_data = self.network_risk.topology.link_data
-        idx, v_old = self.network_risk.find_critical_asset(
-            asset_data, "vulnerability")
+        idx, v_old = self.network_risk.find_critical_index(
+            asset, "vulnerability")
         v_new = v_old - VULN_INC
         vuln = self.network_risk.get_vulnerability(asset)
         if v_new < VULN_MIN:  # vulnerability cannot be reduced below VULN_MIN
@@ -42,17 +46,12 @@ class Defender:
         else:
             vuln[idx] = v_new
         self.network_risk.set_vulnerability(asset, vuln)
-        return (idx, v_old, v_new)
+        return (self._asset_label(asset, idx), v_old, v_new)
 
     def _reduce_asset_consequence(self, asset):
         # Reduce consequence for the most critical asset.
-        asset_data = None
-        if asset == "nodes":
-            asset_data = self.network_risk.topology.node_data
-        elif asset == "links":
-            asset_data = self.network_risk.topology.link_data
-        idx, c_old = self.network_risk.find_critical_asset(
-            asset_data, "consequence")
+        idx, c_old = self.network_risk.find_critical_index(
+            asset, "consequence")
         c_new = c_old - CONS_INC
         cons = self.network_risk.get_consequence(asset)
         if c_new < CONS_MIN:  # consequence cannot be reduced below CONS_MIN
@@ -60,11 +59,83 @@ class Defender:
         else:
             cons[idx] = c_new
         self.network_risk.set_consequence(asset, cons)
-        return (idx, c_old, c_new)
+        return (self._asset_label(asset, idx), c_old, c_new)
+
+    def _critical_asset_heap(self, attackable, values, risk):
+        # Build max-heap of assets ordered as in find_critical_index():
+        # largest attackable, then attribute, then risk and lowest index.
+        # Keys are negated since heapq is a min-heap.
+        heap = list(zip((-attackable.astype(np.int64)).tolist(),
+                        (-values.astype(np.int64)).tolist(),
+                        (-risk.astype(np.int64)).tolist(),
+                        range(len(values))))
+        heapq.heapify(heap)
+        return heap
+
+    def _reduce_incremental(self, asset, attribute, val_min, val_inc):
+        # Greedy reduction of the given attribute using a heap of assets.
+        #
+        # Reducing the attribute of the critical asset only changes the heap
+        # key of that asset, hence only its entry is updated. This gives the
+        # same choices as find_critical_index() in each budget step.
+        attackable = self.network_risk.get_attackable(asset)
+        threat = self.network_risk.get_threat(asset)
+        vuln = self.network_risk.get_vulnerability(asset)
+        cons = self.network_risk.get_consequence(asset)
+        risk = self.network_risk.get_risk(asset)
+        if attribute == "vulnerability":
+            values = vuln
+            weight = threat.astype(np.int64) * cons
+        else:
+            values = cons
+            weight = threat.astype(np.int64) * vuln
+
+        # Risk given with the topology may differ from T x V x C; it is only
+        # used for the first step as set_vulnerability() and
+        # set_consequence() recompute all risks.
+        consistent = np.array_equal(
+            risk, self.network_risk.compute_risk(threat, vuln, cons))
+
+        heap = self._critical_asset_heap(attackable, values, risk)
+        r_sum = 0
+        res = []
+        for it in range(self.budget):
+            idx = heap[0][-1]
+            val_old = values[idx]
+            val_new = val_old - val_inc
+            # Attribute cannot be reduced below val_min:
+            values[idx] = max(val_new, val_min)
+            if it == 0:
+                r_sum = int(self.network_risk.compute_risk(
+                    threat, vuln, cons).sum())
+            else:
+                r_sum += int(values[idx] - val_old) * int(weight[idx])
+            res.append([self._asset_label(asset, idx), val_old, val_new, r_sum])
+
+            if not consistent:
+                consistent = True
+                heap = self._critical_asset_heap(
+                    attackable, values,
+                    self.network_risk.compute_risk(threat, vuln, cons))
+            else:
+                heapq.heapreplace(heap, (-int(attackable[idx]),
+                                         -int(values[idx]),
+                                         -int(values[idx]) * int(weight[idx]),
+                                         idx))
+        if attribute == "vulnerability":
+            self.network_risk.set_vulnerability(asset, values)
+        else:
+            self.network_risk.set_consequence(asset, values)
+        return res
 
     def minimise_vulnerability(self, asset):
         """Minimise vulnerabilities given budget constraint."""
         assert asset == "nodes" or asset == "links"
+        if self.incremental:
+            res = self._reduce_incremental(
+                asset, "vulnerability", VULN_MIN, VULN_INC)
+            self.network_risk.sync()
+            return (res, self.network_risk.topology)
         res = []
         for _ in range(self.budget):
             # Reduce vulnerability for most critical asset:
@@ -73,11 +144,17 @@ class Defender:
             # Compute sum of risks:
             r_sum = self.network_risk.get_risk(asset).sum()
             res.append([idx, v_old, v_new, r_sum])
+        self.network_risk.sync()
         return (res, self.network_risk.topology)
 
     def minimise_consequence(self, asset):
         """Minimise consequences given budget constraint."""
         assert asset == "nodes" or asset == "links"
+        if self.incremental:
+            res = self._reduce_incremental(
+                asset, "consequence", CONS_MIN, CONS_INC)
+            self.network_risk.sync()
+            return (res, self.network_risk.topology)
         res = []
         for _ in range(self.budget):
             # Reduce consequence for most critical asset:
@@ -86,6 +163,7 @@ class Defender:
             # Compute sum of risks:
             r_sum = self.network_risk.get_risk(asset).sum()
             res.append([idx, c_old, c_new, r_sum])
+        self.network_risk.sync()
         return (res, self.network_risk.topology)
 
     def prepare(self):
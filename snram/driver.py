@@ -6,12 +6,16 @@
 
 """This is the driver for SNRAM."""
 
+import os
+import pandas as pd
 from snram.topology import NetworkTopology
 from snram.network_risk import NetworkRisk
 from snram.attacker import Attacker
 from snram.defender import Defender
 from snram.stackelberg import stackelberg
-from snram.interdict import interdiction
+from snram.interdict import interdiction, criticality, heuristic_gap, \
+    od_interdiction
+from snram.solution_cache import SolutionCache
 
 
 def _print_header():
@@ -36,16 +40,34 @@ def driver(xlsx_file, **kwargs):
     solver = kwargs.get("solver", "cplex")
     max_iter = int(kwargs.get("max_iter", 10))
     tee = kwargs.get("tee", False)
+    cache_dir = kwargs.get("cache_dir", None)
+    nodes_file = kwargs.get("nodes_file", None)
+    od_file = kwargs.get("od_file", None)
+    samples = kwargs.get("samples", None)
+    seed = kwargs.get("seed", None)
+    workers = kwargs.get("workers", None)
+    warmstart = kwargs.get("warmstart", False)
+    native_primal = kwargs.get("native_primal", False)
+    cache_size = float(kwargs.get("cache_size", 1024))
+    time_limit = kwargs.get("time_limit", None)
+    mip_gap = kwargs.get("mip_gap", None)
+
+    if run_type == "od" and od_file is None:
+        raise AttributeError("no OD file provided (--od) for run type od")
 
     _print_header()
 
     # Initialise network topology:
-    topology = NetworkTopology(xlsx_file)
+    if xlsx_file.endswith((".csv", ".tsv")):
+        topology = NetworkTopology()
+        topology.load_csv(xlsx_file, nodes_file)
+    else:
+        topology = NetworkTopology(xlsx_file, cache_dir)
     if png_file:
         topology.plot(png_file)
 
     # Conduct network risk assessment:
-    network_risk = NetworkRisk(topology)
+    network_risk = NetworkRisk(topology, samples, seed, workers)
     network_risk.risk_assessment()
 
     # Identify critical assets:
@@ -62,8 +84,23 @@ def driver(xlsx_file, **kwargs):
     elif run_type == "threat":
         attacker = Attacker(network_risk, budget)
         topology = attacker.threat()
-    elif run_type == "interdict":
-        interdiction(topology, interdict, attacks, solver, tee)
+    elif run_type == "gap":
+        heuristic_gap(topology, interdict, attacks, solver, "greedy", tee)
+    elif run_type == "criticality":
+        criticality(topology, interdict)
+    elif run_type in ("interdict", "od"):
+        cache = None
+        if cache_dir:
+            cache = SolutionCache(os.path.join(cache_dir, "solutions"),
+                                  int(cache_size * (1 << 20)))
+        if run_type == "od":
+            od_interdiction(topology, pd.read_csv(od_file, index_col=0),
+                            attacks, solver, tee, workers, warmstart,
+                            native_primal, cache, time_limit, mip_gap)
+        else:
+            interdiction(topology, interdict, attacks, solver, tee, workers,
+                         warmstart, native_primal, cache, time_limit,
+                         mip_gap)
 
     if save_xlsx:
         topology.to_excel(save_xlsx)
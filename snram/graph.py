@@ -0,0 +1,659 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides a compressed sparse row (CSR) graph with array-based kernels."""
+
+import copy
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import scipy.sparse as sp
+
+# Graph shared with the worker processes of CSRGraph.betweenness():
+_WORKER_GRAPH = None
+
+
+def _init_worker(graph):
+    # Store graph once per worker process.
+    global _WORKER_GRAPH  # pylint: disable=global-statement
+    _WORKER_GRAPH = graph
+
+
+def _worker_betweenness(sources, squares, scaled):
+    # Compute betweenness for the given sources in a worker process.
+    return _WORKER_GRAPH.betweenness(sources, squares=squares, scaled=scaled)
+
+
+class CSRGraph:
+    """Class for representing undirected graphs in CSR format.
+
+    Nodes are given by their positions 0, ..., num_nodes - 1. Links in both
+    directions and parallel links are merged into one undirected edge and
+    self-loops are ignored, as for networkx.Graph. The edge of each link is
+    given by link_edge (-1 for self-loops).
+    """
+
+    def __init__(self, num_nodes, start_node, end_node):
+        start_node = np.asarray(start_node, dtype=np.int64)
+        end_node = np.asarray(end_node, dtype=np.int64)
+        self.num_nodes = num_nodes
+
+        # Merge links into undirected edges:
+        key = np.minimum(start_node, end_node) * num_nodes \
+            + np.maximum(start_node, end_node)
+        loop = start_node == end_node
+        key, inverse = np.unique(key[~loop], return_inverse=True)
+        self.link_edge = np.full(len(start_node), -1, dtype=np.int64)
+        self.link_edge[~loop] = inverse
+        self.edge_nodes = np.array([key // num_nodes, key % num_nodes])
+        self.num_edges = len(key)
+
+        self._set_edges(np.arange(self.num_edges))
+
+    def _set_edges(self, edges):
+        # Create CSR arrays for the given edges, stored in both directions.
+        rows = np.concatenate([self.edge_nodes[0, edges],
+                               self.edge_nodes[1, edges]])
+        cols = np.concatenate([self.edge_nodes[1, edges],
+                               self.edge_nodes[0, edges]])
+        order = np.lexsort((cols, rows))
+        self.indices = cols[order]
+        self.edge_ids = np.concatenate([edges, edges])[order]
+        self.indptr = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.num_nodes),
+                  out=self.indptr[1:])
+        self.edges = edges
+
+    def subgraph(self, node_mask):
+        """Return subgraph induced by the nodes in node_mask.
+
+        Node positions and edge numbering are those of this graph.
+        """
+        graph = copy.copy(self)
+        keep = node_mask[self.edge_nodes[0, self.edges]] \
+            & node_mask[self.edge_nodes[1, self.edges]]
+        graph._set_edges(self.edges[keep])  # pylint: disable=protected-access
+        return graph
+
+    def adjacency(self):
+        """Return adjacency matrix as a SciPy sparse matrix."""
+        return sp.csr_matrix((np.ones(len(self.indices)), self.indices,
+                              self.indptr),
+                             shape=(self.num_nodes, self.num_nodes))
+
+    def degree(self):
+        """Return degree of the nodes."""
+        return np.diff(self.indptr)
+
+    def betweenness(self, sources=None, batch_size=None, squares=False,
+                    scaled=False, workers=None):
+        """Compute unnormalised node and edge betweenness (Brandes).
+
+        Dependencies are accumulated over the given source nodes (default
+        all nodes with edges), counting each node pair in both directions.
+        Sources are processed in batches with level-synchronous
+        breadth-first searches, which expand only the nodes reached at the
+        previous level, so that a batch costs O(batch * num_edges) also
+        for long paths.
+
+        If scaled is true, the contribution of a shortest path to a node or
+        edge is weighted by its relative distance from the source (linear
+        scaling; Geisberger, Sanders and Schultes, 2008), and doubled. The
+        sum over all sources is unchanged, but estimates from sampled
+        sources are not inflated near the sampled nodes.
+
+        Returns node betweenness of length num_nodes and edge betweenness
+        of length num_edges. If squares is true, the sum of squared edge
+        dependencies of the sources is returned as a third array, which
+        gives the sampling variance when sources are sampled.
+
+        With more than one worker, the sources are partitioned over a pool
+        of processes. The graph is passed once to each worker and the
+        partial sums are added up at the end.
+        """
+        if sources is None:
+            sources = np.flatnonzero(self.degree() > 0)
+        sources = np.asarray(sources, dtype=np.int64)
+        if workers is not None and workers > 1 and len(sources) > 1:
+            chunks = np.array_split(sources, min(len(sources), 4 * workers))
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(self,)) as executor:
+                results = list(executor.map(_worker_betweenness, chunks,
+                                            [squares] * len(chunks),
+                                            [scaled] * len(chunks)))
+            return tuple(np.sum(values, axis=0) for values in zip(*results))
+        if batch_size is None:
+            batch_size = max(1, 2**22 // max(self.num_nodes, len(self.indices)))
+
+        node_bc = np.zeros(self.num_nodes)
+        edge_bc = np.zeros(self.num_edges)
+        edge_sq = np.zeros(self.num_edges)
+        for start in range(0, len(sources), batch_size):
+            batch = sources[start:start + batch_size]
+            width = len(batch)
+
+            # Path counts, distances + 1 (zero if not reached) and
+            # dependencies are indexed by node * width + source column:
+            sigma = np.zeros(self.num_nodes * width)
+            dist = np.zeros(self.num_nodes * width, dtype=np.int32)
+            delta = np.zeros(self.num_nodes * width)
+
+            # Forward sweep; count shortest paths level by level, expanding
+            # only the nodes reached at the previous level:
+            front = batch * width + np.arange(width)
+            sigma[front] = 1.0
+            dist[front] = 1
+            levels = [front]
+            while True:
+                tail, _, head = self._arcs(front, width)
+                new = dist[head] == 0
+                tail, head = front[tail[new]], head[new]
+                if len(head) == 0:
+                    break
+                front, inverse = np.unique(head, return_inverse=True)
+                sigma[front] = np.bincount(inverse, sigma[tail])
+                dist[front] = len(levels) + 1
+                levels.append(front)
+
+            # Backward sweep; accumulate dependencies over the arcs from
+            # each level to the level above:
+            arcs = []
+            flows = []
+            for lev in range(len(levels) - 1, 0, -1):
+                front = levels[lev]
+                target = 1.0 / lev if scaled else 1.0
+                coeff = (target + delta[front]) / sigma[front]
+                tail, pos, head = self._arcs(front, width)
+                pred = dist[head] == lev
+                tail, pos, head = tail[pred], pos[pred], head[pred]
+                flow = sigma[head] * coeff[tail]
+                prev, inverse = np.unique(head, return_inverse=True)
+                delta[prev] += np.bincount(inverse, flow)
+                if scaled:
+                    flow *= 2.0 * lev - 1.0
+                arcs.append(self.edge_ids[pos])
+                flows.append(flow)
+
+            # Each edge carries one arc per source:
+            if arcs:
+                arcs = np.concatenate(arcs)
+                flows = np.concatenate(flows)
+                edge_bc += np.bincount(arcs, flows, minlength=self.num_edges)
+                if squares:
+                    edge_sq += np.bincount(arcs, np.square(flows),
+                                           minlength=self.num_edges)
+
+            delta[levels[0]] = 0.0
+            if scaled:
+                delta *= 2.0 * np.maximum(dist - 1, 0)
+            node_bc += delta.reshape(self.num_nodes, width).sum(axis=1)
+        if squares:
+            return (node_bc, edge_bc, edge_sq)
+        return (node_bc, edge_bc)
+
+    def _arcs(self, front, width):
+        # Return the arcs leaving the given node * width + column indices,
+        # as the position of their tail in front, their CSR position and the
+        # index of their head in the same column.
+        nodes, cols = np.divmod(front, width)
+        first = self.indptr[nodes]
+        count = self.indptr[nodes + 1] - first
+        pos = np.arange(count.sum()) \
+            + np.repeat(first - np.cumsum(count) + count, count)
+        tail = np.repeat(np.arange(len(front)), count)
+        head = self.indices[pos] * width + np.repeat(cols, count)
+        return (tail, pos, head)
+
+
+class BiconnectedComponents:
+    """Class for maintaining the biconnected components of a graph.
+
+    The blocks (biconnected components) and articulation points of an
+    undirected graph are updated as nodes and edges are added or removed.
+    Removing edges only splits the blocks containing them, which is done
+    once for all removals before the next query. Adding an edge merges the
+    blocks on the path between its end nodes in the block-cut tree.
+    """
+
+    def __init__(self, nodes=(), edges=()):
+        self._adj = {}
+        self._edge_block = {}
+        self._blocks = {}
+        self._node_blocks = {}
+        self._next_block = 0
+        self._articulation = set()
+        self._dirty = {}
+        for n in nodes:
+            self.add_node(n)
+        for u, v in edges:
+            if u != v:
+                self.add_node(u)
+                self.add_node(v)
+                self._adj[u].add(v)
+                self._adj[v].add(u)
+        for block in self._split(self._adj):
+            self._add_block(block)
+
+    @staticmethod
+    def _split(adj):
+        # Split the graph given by adjacency sets into blocks (Tarjan).
+        disc = {}
+        low = {}
+        blocks = []
+        edge_stack = []
+        for root in adj:
+            if root in disc or not adj[root]:
+                continue
+            disc[root] = low[root] = len(disc)
+            stack = [(root, None, iter(adj[root]))]
+            while stack:
+                v, parent, neighbours = stack[-1]
+                for w in neighbours:
+                    if w == parent:
+                        continue
+                    if w not in disc:
+                        disc[w] = low[w] = len(disc)
+                        edge_stack.append((v, w))
+                        stack.append((w, v, iter(adj[w])))
+                        break
+                    if disc[w] < disc[v]:
+                        low[v] = min(low[v], disc[w])
+                        edge_stack.append((v, w))
+                else:
+                    stack.pop()
+                    if parent is not None:
+                        low[parent] = min(low[parent], low[v])
+                        if low[v] >= disc[parent]:
+                            # Pop the block ending with the tree edge:
+                            block = []
+                            while True:
+                                edge = edge_stack.pop()
+                                block.append(frozenset(edge))
+                                if edge == (parent, v):
+                                    break
+                            blocks.append(block)
+        return blocks
+
+    def _update_articulation(self, n):
+        # Node n is an articulation point if it belongs to several blocks.
+        if len(self._node_blocks[n]) > 1:
+            self._articulation.add(n)
+        else:
+            self._articulation.discard(n)
+
+    def _add_block(self, edges):
+        # Add new block with the given edges.
+        b = self._next_block
+        self._next_block += 1
+        self._blocks[b] = edges = set(edges)
+        edge_block = self._edge_block
+        for edge in edges:
+            edge_block[edge] = b
+        for n in set().union(*edges):
+            self._node_blocks[n].add(b)
+            self._update_articulation(n)
+
+    def _remove_block(self, b, nodes=None):
+        # Remove block with the given nodes and return its edges.
+        edges = self._blocks.pop(b)
+        if nodes is None:
+            nodes = set().union(*edges)
+        edge_block = self._edge_block
+        for edge in edges:
+            del edge_block[edge]
+        for n in nodes:
+            if n in self._node_blocks:
+                self._node_blocks[n].discard(b)
+                self._update_articulation(n)
+        return edges
+
+    def _remove_edge_from_block(self, edge):
+        # Remove edge from its block and mark the block for splitting.
+        b = self._edge_block.pop(edge)
+        if b not in self._dirty:
+            self._dirty[b] = set().union(*self._blocks[b])
+        self._blocks[b].discard(edge)
+
+    def _flush(self):
+        # Split blocks that edges have been removed from.
+        if not self._dirty:
+            return
+        edges = []
+        for b, nodes in self._dirty.items():
+            edges.extend(self._remove_block(b, nodes))
+        self._dirty = {}
+        adj = {}
+        for edge in edges:
+            u, v = tuple(edge)
+            adj.setdefault(u, set()).add(v)
+            adj.setdefault(v, set()).add(u)
+        for block in self._split(adj):
+            self._add_block(block)
+
+    def _block_path(self, u, v):
+        # Return blocks on the path from u to v in the block-cut tree, or
+        # an empty list if u and v are not connected.
+        parent = {b: None for b in self._node_blocks[u]}
+        queue = list(parent)
+        for b in queue:
+            if b in self._node_blocks[v]:
+                path = []
+                while b is not None:
+                    path.append(b)
+                    b = parent[b]
+                return path
+            for n in set().union(*self._blocks[b]):
+                if n in self._articulation:
+                    for b_next in self._node_blocks[n]:
+                        if b_next not in parent:
+                            parent[b_next] = b
+                            queue.append(b_next)
+        return []
+
+    @property
+    def articulation(self):
+        """Set of articulation points."""
+        self._flush()
+        return self._articulation
+
+    def add_node(self, n):
+        """Add isolated node."""
+        if n not in self._adj:
+            self._adj[n] = set()
+            self._node_blocks[n] = set()
+
+    def remove_node(self, n):
+        """Remove node and its edges."""
+        if n not in self._adj:
+            return
+        for w in self._adj.pop(n):
+            self._adj[w].discard(n)
+            self._remove_edge_from_block(frozenset((n, w)))
+        for b in self._node_blocks.pop(n):
+            self._dirty[b].discard(n)
+        self._articulation.discard(n)
+
+    def add_edge(self, u, v):
+        """Add edge between nodes u and v."""
+        self.add_node(u)
+        self.add_node(v)
+        if u == v or v in self._adj[u]:
+            return
+        self._flush()
+        path = self._block_path(u, v)
+        self._adj[u].add(v)
+        self._adj[v].add(u)
+        edge = frozenset((u, v))
+        if not path:
+            self._add_block([edge])
+            return
+
+        # Merge the blocks on the path into the largest one:
+        target = max(path, key=lambda b: len(self._blocks[b]))
+        edges = self._blocks[target]
+        edges.add(edge)
+        self._edge_block[edge] = target
+        nodes = {u, v}
+        for b in path:
+            if b != target:
+                merged = self._remove_block(b)
+                edges |= merged
+                for e in merged:
+                    self._edge_block[e] = target
+                nodes |= set().union(*merged)
+        for n in nodes:
+            self._node_blocks[n].add(target)
+            self._update_articulation(n)
+
+    def remove_edge(self, u, v):
+        """Remove edge between nodes u and v."""
+        if u not in self._adj or v not in self._adj[u]:
+            return
+        self._adj[u].discard(v)
+        self._adj[v].discard(u)
+        self._remove_edge_from_block(frozenset((u, v)))
+
+    def blocks(self):
+        """Return the node sets of the blocks."""
+        self._flush()
+        return [set().union(*edges) for edges in self._blocks.values()]
+
+    def is_articulation_point(self, n):
+        """Return true if node n is an articulation point."""
+        return n in self.articulation
+
+
+class FlowNetwork:
+    """Class for computing maximum flows in directed networks.
+
+    Arcs are given by the positions of their start and end nodes and their
+    capacities, where negative capacities are unbounded. The residual
+    network is stored in CSR format with a reverse arc for each arc.
+    Maximum flows are computed with the FIFO push-relabel algorithm
+    (Goldberg and Tarjan, 1988), and minimum-cost flows with successive
+    shortest paths.
+    """
+
+    def __init__(self, num_nodes, start_node, end_node, capacity):
+        start_node = np.asarray(start_node, dtype=np.int64)
+        end_node = np.asarray(end_node, dtype=np.int64)
+        capacity = np.asarray(capacity, dtype=float)
+        self.num_nodes = num_nodes
+        self.num_arcs = len(start_node)
+        self.start_node = start_node
+        self.end_node = end_node
+        self.unbounded = capacity < 0
+        self.augmentations = 0
+
+        # Unbounded arcs can carry at most the sum of the bounded capacities:
+        unbounded = capacity[capacity >= 0].sum() + 1.0
+        self.capacity = np.where(capacity >= 0, capacity, unbounded)
+
+        # Residual arcs; arc a and its reverse arc a + num_arcs:
+        tail = np.concatenate([start_node, end_node])
+        order = np.argsort(tail, kind="stable")
+        self._head = np.concatenate([end_node, start_node]).tolist()
+        self._order = order.tolist()
+        self._indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tail, minlength=num_nodes),
+                  out=self._indptr[1:])
+        self._indptr = self._indptr.tolist()
+
+    def _heights(self, residual, source, target):
+        # Return exact distance labels (global relabelling); distances to
+        # target in the residual network, or num_nodes plus distances to
+        # source for nodes that cannot reach target.
+        num_nodes = self.num_nodes
+        height = [2 * num_nodes] * num_nodes
+        for root, base in ((target, 0), (source, num_nodes)):
+            height[root] = base
+            queue = [root]
+            for v in queue:
+                for k in range(self._indptr[v], self._indptr[v + 1]):
+                    # Residual arc into v is the reverse of arc k:
+                    a = self._order[k]
+                    u = self._head[a]
+                    rev = a - self.num_arcs if a >= self.num_arcs \
+                        else a + self.num_arcs
+                    if residual[rev] > 0 and height[u] == 2 * num_nodes:
+                        height[u] = height[v] + 1
+                        queue.append(u)
+        return height
+
+    def max_flow(self, source, target, removed=(), capacity=None):
+        """Return maximum flow from source to target.
+
+        Arcs in removed are left out, and capacity replaces the capacities
+        of the arcs if given. Returns the flow value, the flow on each arc
+        and a mask of the nodes on the source side of a minimum cut.
+        """
+        num_nodes = self.num_nodes
+        num_arcs = self.num_arcs
+        if capacity is None:
+            capacity = self.capacity
+        residual = np.concatenate([capacity, np.zeros(num_arcs)])
+        residual[list(removed)] = 0.0
+        residual = residual.tolist()
+        head = self._head
+        order = self._order
+        indptr = self._indptr
+
+        height = self._heights(residual, source, target)
+        height[source] = num_nodes
+        excess = [0.0] * num_nodes
+        current = indptr[:-1]
+        queue = []
+        relabels = 0
+
+        def push(a, u, delta):
+            # Push delta units along residual arc a from u.
+            v = head[a]
+            rev = a - num_arcs if a >= num_arcs else a + num_arcs
+            residual[a] -= delta
+            residual[rev] += delta
+            excess[u] -= delta
+            if excess[v] == 0.0 and v not in (source, target):
+                queue.append(v)
+            excess[v] += delta
+
+        # Saturate arcs leaving the source:
+        for k in range(indptr[source], indptr[source + 1]):
+            a = order[k]
+            if residual[a] > 0:
+                push(a, source, residual[a])
+
+        # Discharge active nodes in FIFO order:
+        for u in queue:
+            while excess[u] > 0:
+                if current[u] == indptr[u + 1]:
+                    relabels += 1
+                    if relabels % num_nodes == 0:
+                        height = self._heights(residual, source, target)
+                        current = indptr[:-1]
+                    else:
+                        height[u] = 1 + min(
+                            height[head[order[k]]]
+                            for k in range(indptr[u], indptr[u + 1])
+                            if residual[order[k]] > 0)
+                        current[u] = indptr[u]
+                    continue
+                a = order[current[u]]
+                if residual[a] > 0 and height[u] == height[head[a]] + 1:
+                    push(a, u, min(excess[u], residual[a]))
+                else:
+                    current[u] += 1
+
+        # Nodes reachable from the source in the residual network:
+        cut = np.zeros(num_nodes, dtype=bool)
+        cut[source] = True
+        stack = [source]
+        while stack:
+            u = stack.pop()
+            for k in range(indptr[u], indptr[u + 1]):
+                a = order[k]
+                v = head[a]
+                if residual[a] > 0 and not cut[v]:
+                    cut[v] = True
+                    stack.append(v)
+
+        flow = np.array(residual[num_arcs:])
+        return (excess[target], flow, cut)
+
+    def min_cost_flow(self, cost, supply_demand, max_cost=np.inf):
+        """Return minimum-cost flow from supply to demand nodes.
+
+        Nodes with negative supply_demand supply and nodes with positive
+        supply_demand demand the given amounts. Units are sent along the
+        cheapest paths (successive shortest paths with Dijkstra and node
+        potentials) as long as a path costs less than max_cost per unit.
+        Costs must be non-negative. Returns the flow on each arc.
+
+        Each augmentation saturates a residual arc or exhausts a supply or
+        demand, and residual capacities below a tolerance relative to the
+        total supply count as saturated, so the number of augmentations
+        depends on the number of arcs and terminals rather than on the
+        amounts supplied. The count of the last call is kept in
+        augmentations.
+        """
+        supply_demand = np.asarray(supply_demand, dtype=float)
+        supply = np.flatnonzero(supply_demand < 0)
+        demand = np.flatnonzero(supply_demand > 0)
+
+        # Network with a super source and a super sink:
+        num_nodes = self.num_nodes + 2
+        source = num_nodes - 2
+        sink = num_nodes - 1
+        start = np.concatenate([self.start_node,
+                                np.full(len(supply), source), demand])
+        end = np.concatenate([self.end_node, supply,
+                              np.full(len(demand), sink)])
+        num_arcs = len(start)
+        residual = np.concatenate([
+            np.where(self.unbounded, np.inf, self.capacity),
+            -supply_demand[supply], supply_demand[demand],
+            np.zeros(num_arcs)]).tolist()
+        cost = np.concatenate([cost, np.zeros(len(supply) + len(demand))])
+        arc_cost = np.concatenate([cost, -cost]).tolist()
+        tail = np.concatenate([start, end])
+        head = np.concatenate([end, start]).tolist()
+        order = np.argsort(tail, kind="stable").tolist()
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tail, minlength=num_nodes), out=indptr[1:])
+        indptr = indptr.tolist()
+
+        # Residual capacities below tol are treated as zero, so that
+        # round-off does not leave arcs open for negligible augmentations:
+        tol = 1.0e-12 * max(1.0, np.abs(supply_demand).sum())
+        potential = [0.0] * num_nodes
+        augmentations = 0
+        while True:
+            # Shortest paths with reduced costs, which are non-negative up to
+            # round-off; the search stops when the sink is reached:
+            dist = [np.inf] * num_nodes
+            pred = [-1] * num_nodes
+            done = [False] * num_nodes
+            dist[source] = 0.0
+            heap = [(0.0, source)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if done[u]:
+                    continue
+                done[u] = True
+                if u == sink:
+                    break
+                for k in range(indptr[u], indptr[u + 1]):
+                    a = order[k]
+                    if residual[a] > tol:
+                        v = head[a]
+                        dv = d + max(arc_cost[a] + potential[u]
+                                     - potential[v], 0.0)
+                        if dv < dist[v] and not done[v]:
+                            dist[v] = dv
+                            pred[v] = a
+                            heapq.heappush(heap, (dv, v))
+            if dist[sink] == np.inf \
+                    or dist[sink] + potential[sink] >= max_cost:
+                break
+            # Potentials of nodes beyond the sink grow by the distance to
+            # the sink, which keeps all reduced costs non-negative:
+            for v in range(num_nodes):
+                potential[v] += min(dist[v], dist[sink])
+
+            # Augment along the path:
+            path = []
+            v = sink
+            while v != source:
+                a = pred[v]
+                path.append(a)
+                v = head[a - num_arcs if a >= num_arcs else a + num_arcs]
+            delta = min(residual[a] for a in path)
+            for a in path:
+                residual[a] -= delta
+                residual[a - num_arcs if a >= num_arcs
+                         else a + num_arcs] += delta
+            augmentations += 1
+        self.augmentations = augmentations
+        return np.array(residual[num_arcs:num_arcs + self.num_arcs])
@@ -6,12 +6,165 @@
 
 """Wrapper for solving network interdiction problems."""
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import pandas as pd
 from snram.max_flow_interdict import MaxFlowInterdiction
 from snram.min_cost_flow_interdict import MinCostFlowInterdiction
 from snram.sp_interdict import SPInterdiction
 
+# Interdiction models for each method:
+INTERDICTION = {"max-flow": MaxFlowInterdiction,
+                "min-cost-flow": MinCostFlowInterdiction,
+                "shortest-path": SPInterdiction}
 
-def interdiction(topology, method, attacks=0, solver="cplex", tee=False):
+# Interdiction model of a worker process in interdiction_sweep():
+_WORKER_MODEL = None
+
+
+def _init_worker(topology, method, solver, tee, warmstart, native_primal,
+                 cache, time_limit, mip_gap, callback, *terminals):
+    # Create interdiction model and solver once per worker process.
+    global _WORKER_MODEL  # pylint: disable=global-statement
+    _WORKER_MODEL = INTERDICTION[method](topology, 0, solver, tee, warmstart,
+                                         native_primal, cache, time_limit,
+                                         mip_gap, callback, *terminals)
+
+
+def _solve_attacks(attacks):
+    # Solve interdiction problem for given number of attacks in a worker.
+    _WORKER_MODEL.set_attacks(attacks)
+    _WORKER_MODEL.solve()
+    return _WORKER_MODEL.solution()
+
+
+def _sweep_model(model, attacks):
+    # Solve interdiction problem of the model for 0, ..., attacks attacks.
+    records = []
+    for it in range(attacks + 1):
+        model.set_attacks(it)
+        model.solve()
+        records.append(model.solution())
+    return records
+
+
+def _solve_od(attacks, pair):
+    # Solve max-flow interdiction problem for an OD pair in a worker.
+    _WORKER_MODEL.set_od(*pair)
+    return _sweep_model(_WORKER_MODEL, attacks)
+
+
+def interdiction_sweep(topology, method, attacks=0, solver="cplex",
+                       tee=False, workers=None, warmstart=False,
+                       native_primal=False, cache=None, time_limit=None,
+                       mip_gap=None, callback=None):
+    """Solve network interdiction problem for 0, ..., attacks attacks.
+
+    Returns a list of solution records in the order of the number of
+    attacks. With more than one worker, the budgets are solved in parallel
+    by a pool of processes, each with its own model and solver instance.
+    The interdiction of the largest budget is stored in the topology.
+    With warmstart=True, each budget is warm started from the solution of
+    the previous budget solved by the same process. With
+    native_primal=True, the flows after interdiction are computed with
+    network-flow algorithms instead of linear programs. Solutions are
+    looked up in and saved to the SolutionCache given as cache, if any.
+    Each budget is solved within time_limit seconds and the relative
+    mip_gap, if given, and improving interdictions are passed to the
+    callback (in the worker processes with more than one worker).
+    """
+    if method not in INTERDICTION:
+        raise AttributeError("unknown interdiction method provided")
+    if workers is None or workers < 2 or attacks < 1:
+        model = INTERDICTION[method](topology, 0, solver, tee, warmstart,
+                                     native_primal, cache, time_limit,
+                                     mip_gap, callback)
+        return _sweep_model(model, attacks)
+
+    with ProcessPoolExecutor(min(workers, attacks + 1),
+                             initializer=_init_worker,
+                             initargs=(topology, method, solver, tee,
+                                       warmstart, native_primal, cache,
+                                       time_limit, mip_gap, callback)) \
+            as executor:
+        records = list(executor.map(_solve_attacks, range(attacks + 1)))
+    topology.link_data["xbar"] = \
+        topology.link_data.index.isin(records[-1]["interdicted"]) * 1.0
+    return records
+
+
+def od_pairs(od, nodes=None):
+    """Return list of OD pairs from a list of pairs or an OD matrix.
+
+    An OD matrix is a data frame with origins as index and destinations
+    as columns, where pairs with nonzero entries are selected. If the node
+    labels are given, origins and destinations are matched to them by
+    their string form, so that labels read as strings (such as numeric IDs
+    in the header of a CSV file) refer to the same nodes.
+    """
+    if isinstance(od, pd.DataFrame):
+        stacked = od.stack()
+        pairs = [pair for pair, value in stacked.items()
+                 if value and pair[0] != pair[1]]
+    else:
+        pairs = [tuple(pair) for pair in od]
+    if nodes is not None:
+        labels = {str(node): node for node in nodes}
+        pairs = [tuple(labels.get(str(node), node) for node in pair)
+                 for pair in pairs]
+    return pairs
+
+
+def od_interdiction(topology, od, attacks=0, solver="cplex", tee=False,
+                    workers=None, warmstart=False, native_primal=False,
+                    cache=None, time_limit=None, mip_gap=None):
+    """Solve max-flow interdiction for 0, ..., attacks attacks per OD pair.
+
+    The OD pairs are given as a list of (source, target) pairs or as an OD
+    matrix, and are matched to the nodes of the topology (see od_pairs()).
+    The models are built once (per worker) and only the source and target
+    terms are changed between pairs. With more than one worker, the pairs
+    are solved in parallel by a pool of processes. Returns a data frame of
+    the max flow after interdiction, with the number of attacks as index
+    and the OD pairs as columns (also printed), and a dict of the solution
+    records of each OD pair.
+    """
+    pairs = od_pairs(od, topology.node_data.index)
+    if not pairs:
+        raise AttributeError("no OD pairs provided")
+    if workers is None or workers < 2 or len(pairs) < 2:
+        model = MaxFlowInterdiction(topology, 0, solver, tee, warmstart,
+                                    native_primal, cache, time_limit,
+                                    mip_gap, None, *pairs[0])
+        results = []
+        for pair in pairs:
+            model.set_od(*pair)
+            results.append(_sweep_model(model, attacks))
+    else:
+        with ProcessPoolExecutor(min(workers, len(pairs)),
+                                 initializer=_init_worker,
+                                 initargs=(topology, "max-flow", solver, tee,
+                                           warmstart, native_primal, cache,
+                                           time_limit, mip_gap, None,
+                                           *pairs[0])) \
+                as executor:
+            results = list(executor.map(partial(_solve_od, attacks), pairs))
+    records = dict(zip(pairs, results))
+    table = pd.DataFrame(
+        [[records[pair][it]["primal"] + 0.0 for pair in pairs]
+         for it in range(attacks + 1)],
+        index=pd.RangeIndex(attacks + 1, name="attacks"),
+        columns=pd.MultiIndex.from_tuples(pairs, names=["source", "target"]))
+    print("\nMax flow after interdiction per OD pair:")
+    print("%s" % ("-" * 70))
+    print(table.T.to_string())
+    print("%s" % ("-" * 70))
+    return table, records
+
+
+def interdiction(topology, method, attacks=0, solver="cplex", tee=False,
+                 workers=None, warmstart=False, native_primal=False,
+                 cache=None, time_limit=None, mip_gap=None):
     """Solver for network interdiction problems."""
     if method == "max-flow":
         print("======================================================================")
@@ -19,30 +172,85 @@ def interdiction(topology, method, attacks=0, solver="cplex", tee=False):
         print("                        Max Flow Interdiction                         ")
         print("                                                                      ")
         print("======================================================================")
-        for it in range(attacks + 1):
-            print()
-            model = MaxFlowInterdiction(topology, it, solver, tee)
-            model.solve()
-            model.print()
     elif method == "min-cost-flow":
         print("======================================================================")
         print("                                                                      ")
         print("                      Min-Cost-Flow Interdiction                      ")
         print("                                                                      ")
         print("======================================================================")
-        for it in range(attacks + 1):
-            print()
-            model = MinCostFlowInterdiction(topology, it, solver, tee)
-            model.solve()
-            model.print()
     elif method == "shortest-path":
         print("======================================================================")
         print("                                                                      ")
         print("                      Shortest Path Interdiction                      ")
         print("                                                                      ")
         print("======================================================================")
+    else:
+        return
+    if workers is None or workers < 2:
+        model = INTERDICTION[method](topology, 0, solver, tee, warmstart,
+                                     native_primal, cache, time_limit,
+                                     mip_gap)
         for it in range(attacks + 1):
             print()
-            model = SPInterdiction(topology, it, solver, tee)
+            model.set_attacks(it)
             model.solve()
             model.print()
+        return
+    records = interdiction_sweep(topology, method, attacks, solver, tee,
+                                 workers, warmstart, native_primal, cache,
+                                 time_limit, mip_gap)
+    for record in records:
+        print()
+        INTERDICTION[method].print_solution(record)
+
+
+def heuristic_gap(topology, method, attacks=0, solver="cplex",
+                  heuristic="greedy", tee=False):
+    """Compare heuristic and exact interdiction for 0, ..., attacks attacks.
+
+    Returns a list of records with the number of attacks, the exact and
+    heuristic objectives, the relative optimality gap |heuristic - exact|
+    / max(|heuristic|, |exact|) and the solve times. The exact
+    interdiction of the largest budget is stored in the topology.
+    """
+    approx = interdiction_sweep(topology, method, attacks, heuristic, tee)
+    exact = interdiction_sweep(topology, method, attacks, solver, tee)
+    records = []
+    print("\nOptimality gap of %s interdiction:" % heuristic)
+    print("%s" % ("-" * 70))
+    print("Attacks\tExact\t\tHeuristic\tGap (%)\t\tTime (s)")
+    print("%s" % ("-" * 70))
+    for e, a in zip(exact, approx):
+        scale = max(abs(e["primal"]), abs(a["primal"]))
+        gap = abs(a["primal"] - e["primal"]) / scale if scale > 0 else 0.0
+        records.append({"attacks": e["attacks"], "exact": e["primal"],
+                        "heuristic": a["primal"], "gap": gap,
+                        "time_exact": e["time"], "time_heuristic": a["time"]})
+        print("%d\t%-12.2f\t%-12.2f\t%-12.2f\t%.2f / %.2f" %
+              (e["attacks"], e["primal"], a["primal"], 100.0 * gap,
+               e["time"], a["time"]))
+    print("%s" % ("-" * 70))
+    return records
+
+
+def criticality(topology, method, top=10):
+    """Print links ranked by criticality from re-solves of the primal.
+
+    Only linear programs are solved, in matrix form with HiGHS through
+    SciPy, so the models are built in matrix form whatever the solver of
+    the interdiction.
+    """
+    if method not in INTERDICTION:
+        raise AttributeError("unknown interdiction method provided")
+    model = INTERDICTION[method](topology, 0, "scipy")
+    ranking = model.criticality()
+    print("\nLink Criticality:")
+    print("%s" % ("-" * 70))
+    print("Link\t\tFlow\t\tPrice\t\tCriticality")
+    print("%s" % ("-" * 70))
+    for (ei, ej), row in ranking.head(top).iterrows():
+        eij = "(" + str(ei) + ", " + str(ej) + ")"
+        print("%-12s\t%.2f\t\t%.2f\t\t%.2f" %
+              (eij, row["flow"], row["price"], row["criticality"]))
+    print("%s" % ("-" * 70))
+    return ranking
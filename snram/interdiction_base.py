@@ -0,0 +1,172 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides the base class of the network interdiction models."""
+
+import logging
+import time
+import pyomo.environ as pe
+from snram.topology import NetworkTopology
+from snram.matrix_model import MatrixModel
+from snram.interdiction_result import var_values
+from snram.solution_cache import load_solution_state
+from snram.async_solve import solve_in_subprocess
+
+
+def _create(cls, args, incumbent):
+    # Create an interdiction model in the subprocess of solve_async(), with
+    # the incumbent of the model in the parent for warm starts.
+    model = cls(*args)
+    model._incumbent = incumbent  # pylint: disable=protected-access
+    return model
+
+
+class Interdiction:
+    """Base class for network interdiction models.
+
+    The models are built from a NetworkTopology or the name of a file with
+    the topology. Subclasses create the primal (flows after interdiction,
+    with the interdiction stored in xbar) and the interdiction model (x)
+    for the given number of attacks and solver.
+
+    With warmstart=True, each solve starts from the interdiction of the
+    previous solve if it had at most as many attacks, and its objective is
+    used as a cutoff. The time of the last solve is stored in solve_time.
+
+    With a SolutionCache given as cache, solutions are looked up in the
+    cache before solving and saved to it after solving.
+
+    Each solve can be given a time limit (in seconds) and a relative MIP
+    gap. The best interdiction found is then kept if it is not proven
+    optimal. The callback, if any, is called with a dict of the number of
+    attacks, the interdicted links, the objective and the time for each
+    improving interdiction found (only the last for Pyomo solvers).
+    """
+
+    def __init__(self, topology, attacks=0, solver="cplex", tee=False,
+                 warmstart=False, native_primal=False, cache=None,
+                 time_limit=None, mip_gap=None, callback=None):
+        self._topology = None
+        if isinstance(topology, NetworkTopology):
+            self._topology = topology
+        elif isinstance(topology, str):  # filename is provided
+            self._topology = NetworkTopology(topology)
+        else:
+            raise AttributeError("unknown topology provided")
+
+        self._attacks = attacks
+        self._solver = solver
+        self._tee = tee
+        self._warmstart = warmstart
+        self._native_primal = native_primal
+        self._cache = cache
+        self._time_limit = time_limit
+        self._mip_gap = mip_gap
+        self._callback = callback
+        self._incumbent = None
+        self._start = None
+        self._primal_solver = None
+        self._idual_solver = None
+        self.solve_time = None
+
+    def _load_cached(self, key):
+        # Load solution from the cache; return true if found.
+        if not self._cache.load(key, self._primal, self._idual):
+            return False
+        self._set_interdiction()
+        self._report(var_values(self._idual.x), self._idual.OBJ())
+        return True
+
+    def _set_interdiction(self):
+        # Set xbar of the topology and primal, and the incumbent, from the
+        # solution loaded into the interdiction model.
+        xbar = var_values(self._idual.x)
+        self._topology.link_data["xbar"] = xbar[self._index.link_edge]
+        if not isinstance(self._primal, MatrixModel):
+            self._primal.xbar.store_values(dict(zip(self._index.edges, xbar)))
+        if isinstance(self._idual, MatrixModel):
+            objective = self._idual.OBJ()
+        else:
+            objective = pe.value(self._idual.OBJ, exception=False)
+        self._incumbent = None
+        if objective is not None:
+            self._incumbent = (self._attacks, objective)
+
+    def _report(self, x, objective):
+        # Pass an improving interdiction to the callback, if any.
+        if self._callback is None:
+            return
+        self._callback({
+            "attacks": self._attacks,
+            "interdicted": sorted(e for e, xe in zip(self._index.edges, x)
+                                  if xe > 0.5),
+            "objective": float(objective),
+            "time": time.perf_counter() - self._start})
+
+    def _report_matrix(self, solution, objective):
+        # Pass an improving solution of the interdiction model in matrix
+        # form to the callback.
+        x = self._idual.x
+        self._report(solution[x.offset:x.offset + len(x)], objective)
+
+    def _remaining_time(self):
+        # Return time left of the time limit of the solve, if any.
+        if self._time_limit is None:
+            return None
+        return max(self._time_limit - (time.perf_counter() - self._start),
+                   0.0)
+
+    def _timed_out(self):
+        # Return true if the time limit of the solve is reached.
+        if self._remaining_time() == 0.0:
+            logging.warning("Time limit reached, check solver optimality")
+            return True
+        return False
+
+    def _cutoff(self):
+        # Return objective of the incumbent if feasible for the attacks.
+        if self._warmstart and self._incumbent is not None \
+                and self._incumbent[0] <= self._attacks:
+            return self._incumbent[1]
+        return None
+
+    def _args(self):
+        # Return constructor arguments of a model in the current state,
+        # without the callback.
+        return (self._topology, self._attacks, self._solver, self._tee,
+                self._warmstart, self._native_primal, self._cache,
+                self._time_limit, self._mip_gap, None)
+
+    def set_attacks(self, attacks):
+        """Set number of attacks."""
+        self._attacks = attacks
+
+    def set_callback(self, callback):
+        """Set callback for improving interdictions."""
+        self._callback = callback
+
+    async def solve_async(self, timeout=None, context=None):
+        """Solve the interdiction problem in a subprocess.
+
+        The solve can be awaited together with other tasks, and cancelled.
+        After timeout seconds, it is cancelled with asyncio.TimeoutError.
+        Cancelling terminates the subprocess and the solvers it started.
+        The models are built anew in the subprocess, which is started with
+        the given multiprocessing context (e.g. for the spawn start
+        method) or the default one. The solution is loaded into the models
+        as by solve(), but duals of the primal are not available.
+        """
+        state, solve_time = await solve_in_subprocess(
+            _create, (type(self), self._args(), self._incumbent),
+            self._callback, timeout, context)
+        load_solution_state(self._primal, self._idual, state)
+        self._set_interdiction()
+        self.solve_time = solve_time
+        return self._primal, self._idual
+
+    def print(self):
+        """Print solution."""
+        self.print_solution(self.solution())
@@ -0,0 +1,127 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides solutions of interdiction models as arrays."""
+
+import logging
+import numpy as np
+import pandas as pd
+import pyomo.environ as pe
+from snram.matrix_model import MatrixVar
+
+
+def var_values(var):
+    """Return values of a Pyomo or matrix-model variable as an array.
+
+    Values of unsolved variables are NaN.
+    """
+    if isinstance(var, MatrixVar):
+        if not var.solved():
+            return np.full(len(var), np.nan)
+        return np.array(var.values(), dtype=float)
+    return np.array([v.value for v in var.values()], dtype=float)
+
+
+def constraint_duals(model, constraint, keys):
+    """Return duals of the constraints of a Pyomo model for given keys.
+
+    Duals are NaN for skipped constraints and if the solver provided none.
+    """
+    duals = np.full(len(keys), np.nan)
+    suffix = getattr(model, "dual", None)
+    if not isinstance(suffix, pe.Suffix) or not len(suffix):
+        return duals
+    for k, key in enumerate(keys):
+        if key in constraint:
+            dual = suffix.get(constraint[key])
+            if dual is not None:
+                duals[k] = dual
+    return duals
+
+
+class InterdictionResult:
+    """Class for solutions of interdiction models.
+
+    The interdiction (xbar) and flow on each edge (unique link) and the
+    unsatisfied supply and demand on each node are stored as arrays, as
+    are the duals of the flow-balance and capacity constraints of the
+    primal when the solver provides them. Missing quantities are None.
+    """
+
+    def __init__(self, attacks, edges, nodes, xbar, flow, **kwargs):
+        self.attacks = attacks
+        self.edges = edges
+        self.nodes = nodes
+        self.xbar = xbar
+        self.flow = flow
+        self.unsat_supply = kwargs.get("unsat_supply", None)
+        self.unsat_demand = kwargs.get("unsat_demand", None)
+        self.node_dual = kwargs.get("node_dual", None)
+        self.link_dual = kwargs.get("link_dual", None)
+        self.primal = kwargs.get("primal", None)
+        self.dual = kwargs.get("dual", None)
+        self.time = kwargs.get("time", None)
+
+    def interdicted(self):
+        """Return sorted list of interdicted links."""
+        return sorted(e for e, x in zip(self.edges, self.xbar) if x > 0.5)
+
+    def to_frame(self, asset="links"):
+        """Return data frame of the solution for links or nodes."""
+        if asset == "links":
+            data = {"xbar": self.xbar, "flow": self.flow,
+                    "dual": self.link_dual}
+            index = pd.MultiIndex.from_tuples(
+                self.edges, names=["start_node", "end_node"])
+        elif asset == "nodes":
+            data = {"unsat_supply": self.unsat_supply,
+                    "unsat_demand": self.unsat_demand,
+                    "dual": self.node_dual}
+            index = pd.Index(self.nodes, name="node")
+        else:
+            raise KeyError("unknown asset: " + str(asset))
+        return pd.DataFrame({k: v for k, v in data.items() if v is not None},
+                            index=index)
+
+    def to_records(self, asset="links"):
+        """Return the solution for links or nodes as a list of dicts."""
+        return self.to_frame(asset).reset_index().to_dict("records")
+
+
+def link_criticality(index, primal):
+    """Return attackable links ranked by criticality as a data frame.
+
+    The primal is the matrix-form primal solved without interdiction. Each
+    attackable edge carrying flow is cut in turn by bounding its flow at
+    zero, and the primal is re-solved. The criticality of the edge is the
+    resulting loss of the objective, i.e., the cost of rerouting its flow
+    (or the flow lost for max-flow), which is the objective of
+    interdicting the edge alone. The price is the reduced cost of the
+    bound, the marginal rerouting cost per unit of flow on the cut edge.
+    Edges without flow have zero criticality.
+    """
+    sign = 1.0 if primal.sense == pe.minimize else -1.0
+    objective = primal.OBJ()
+    flow = np.nan_to_num(var_values(primal.y)) + 0.0  # no negative zeros
+    attackable = np.array(index.attackable, dtype=float)[index.edge_link] > 0
+    lower, upper = primal.var_bounds("y")
+    price = np.zeros(len(flow))
+    loss = np.zeros(len(flow))
+    for k in np.flatnonzero(attackable & (flow > 0)):
+        cut = upper.copy()
+        cut[k] = 0.0
+        primal.set_var_bounds("y", lower, cut)
+        if not primal.solve():
+            logging.warning("Check solver optimality")
+        price[k] = -sign * primal.y.reduced_costs()[k]
+        loss[k] = sign * (primal.OBJ() - objective)
+    primal.set_var_bounds("y", lower, upper)
+    frame = pd.DataFrame(
+        {"flow": flow, "price": price, "criticality": loss},
+        index=pd.MultiIndex.from_tuples(index.edges,
+                                        names=["start_node", "end_node"]))
+    return frame[attackable].sort_values("criticality", ascending=False,
+                                         kind="stable")
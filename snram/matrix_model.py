@@ -0,0 +1,348 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides linear programs in matrix form solved with SciPy (HiGHS)."""
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, linprog, Bounds, LinearConstraint
+import pyomo.environ as pe
+
+try:
+    import highspy
+except ImportError:  # incumbents are then not streamed
+    highspy = None
+
+# Older versions of highspy have no callbacks; only the last incumbent is
+# then passed to the callback:
+_HIGHS_CALLBACKS = hasattr(getattr(highspy, "Highs", None),
+                           "cbMipImprovingSolution")
+
+
+class MatrixVarData:
+    """Class for accessing the value of a variable as for Pyomo."""
+
+    __slots__ = ("_var", "_pos")
+
+    def __init__(self, var, pos):
+        self._var = var
+        self._pos = pos
+
+    @property
+    def value(self):
+        """Value of the variable, or None if the model is not solved."""
+        return self._var.values()[self._pos] if self._var.solved() else None
+
+
+class MatrixVar:
+    """Class for indexed variables of a matrix model."""
+
+    def __init__(self, model, keys, offset):
+        self._model = model
+        self._keys = {key: k for k, key in enumerate(keys)}
+        self.offset = offset
+        self.size = len(keys)
+
+    def __getitem__(self, key):
+        return MatrixVarData(self, self._keys[key])
+
+    def __len__(self):
+        return self.size
+
+    def solved(self):
+        """Return true if the model has been solved."""
+        return self._model.solution is not None
+
+    def values(self):
+        """Return values of the variables as an array."""
+        return self._model.solution[self.offset:self.offset + self.size]
+
+    def reduced_costs(self):
+        """Return reduced costs of the variables, or None if not known."""
+        if self._model.reduced_costs is None:
+            return None
+        return self._model.reduced_costs[self.offset:self.offset + self.size]
+
+
+class MatrixModel:
+    """Class for linear and mixed-integer programs in matrix form.
+
+    Variables are added as indexed blocks and constraints as sparse blocks
+    of rows, lb <= A x <= ub. The model is solved with HiGHS through
+    scipy.optimize.milp without building expression trees. Solved values
+    are accessed as model.name[key].value and the objective as model.OBJ(),
+    as for the Pyomo models.
+
+    Models without integer variables are solved as linear programs, and
+    the duals of the constraints (per block of rows) and reduced costs of
+    the variables are stored in duals and reduced_costs. These are the
+    changes of the objective per unit increase of the bounds.
+
+    Mixed-integer programs can be given a time limit and a relative MIP
+    gap, and a callback called with each improving solution found by
+    HiGHS (through highspy if installed with callbacks, otherwise only the
+    last).
+    """
+
+    def __init__(self, sense=pe.minimize):
+        self.sense = sense
+        self.solution = None
+        self.success = False
+        self.duals = None
+        self.reduced_costs = None
+        self._objective = None
+        self._vars = {}
+        self._cost = []
+        self._lb = []
+        self._ub = []
+        self._integrality = []
+        self._rows = {}
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["_vars"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def _num_vars(self):
+        # Return number of variables.
+        return sum(len(cost) for cost in self._cost)
+
+    def add_var(self, name, keys, lb=0.0, ub=np.inf, cost=0.0,
+                integer=False):
+        """Add block of variables indexed by keys."""
+        size = len(keys)
+        self._vars[name] = MatrixVar(self, keys, self._num_vars())
+        self._cost.append(np.broadcast_to(cost, size).astype(float))
+        self._lb.append(np.broadcast_to(lb, size).astype(float))
+        self._ub.append(np.broadcast_to(ub, size).astype(float))
+        self._integrality.append(np.full(size, int(integer)))
+
+    def set_cost(self, name, cost):
+        """Set objective coefficients of block of variables."""
+        block = list(self._vars).index(name)
+        self._cost[block] = np.broadcast_to(
+            cost, len(self._cost[block])).astype(float)
+
+    def var_bounds(self, name):
+        """Return copies of the bounds of block of variables."""
+        block = list(self._vars).index(name)
+        return self._lb[block].copy(), self._ub[block].copy()
+
+    def set_var_bounds(self, name, lb, ub):
+        """Set bounds of block of variables."""
+        block = list(self._vars).index(name)
+        size = len(self._lb[block])
+        self._lb[block] = np.broadcast_to(lb, size).astype(float)
+        self._ub[block] = np.broadcast_to(ub, size).astype(float)
+
+    def add_constraints(self, name, num_rows, rows, cols, vals, lb, ub):
+        """Add block of constraints given by coordinates of nonzeros.
+
+        Columns are positions in the vector of all variables (see
+        column()). Rows without nonzeros are removed when solving, as Pyomo
+        skips trivial constraints.
+        """
+        self._rows[name] = [np.asarray(rows, dtype=np.int64),
+                            np.asarray(cols, dtype=np.int64),
+                            np.asarray(vals, dtype=float),
+                            np.broadcast_to(lb, num_rows).astype(float),
+                            np.broadcast_to(ub, num_rows).astype(float)]
+
+    def set_bounds(self, name, lb, ub):
+        """Set bounds of block of constraints."""
+        block = self._rows[name]
+        block[3] = np.broadcast_to(lb, len(block[3])).astype(float)
+        block[4] = np.broadcast_to(ub, len(block[4])).astype(float)
+
+    def column(self, name, pos):
+        """Return column positions of variables in block."""
+        return self._vars[name].offset + np.asarray(pos, dtype=np.int64)
+
+    def solve(self, cutoff=None, time_limit=None, mip_gap=None,
+              callback=None):
+        """Solve the model; return true if an optimal solution is found.
+
+        A cutoff excludes solutions with worse objective values. It is
+        added as a bound on the objective, since scipy.optimize.milp does
+        not accept a starting point or cutoff. With a time limit (in
+        seconds) or MIP gap, the best solution found is kept if it is not
+        proven optimal. The callback is called as callback(solution,
+        objective) for improving solutions.
+        """
+        num_vars = self._num_vars()
+        cost = np.concatenate(self._cost)
+        matrices = []
+        lower = []
+        upper = []
+        kept = []
+        for rows, cols, vals, lb, ub in self._rows.values():
+            mat = sp.csr_matrix((vals, (rows, cols)),
+                                shape=(len(lb), num_vars))
+            mat.eliminate_zeros()
+            keep = np.diff(mat.indptr) > 0
+            matrices.append(mat[keep])
+            lower.append(lb[keep])
+            upper.append(ub[keep])
+            kept.append(keep)
+        if cutoff is not None:
+            # Relax the cutoff to keep solutions of equal value:
+            tol = 1.0e-6 * max(1.0, abs(cutoff))
+            matrices.append(sp.csr_matrix(cost))
+            if self.sense == pe.minimize:
+                lower.append([-np.inf])
+                upper.append([cutoff + tol])
+            else:
+                lower.append([cutoff - tol])
+                upper.append([np.inf])
+        integrality = np.concatenate(self._integrality)
+        self.duals = None
+        self.reduced_costs = None
+        if not integrality.any():
+            return self._solve_lp(cost, matrices, lower, upper, kept)
+        options = {}
+        if time_limit is not None:
+            options["time_limit"] = max(float(time_limit), 0.0)
+        if mip_gap is not None:
+            options["mip_rel_gap"] = float(mip_gap)
+        if callback is not None and _HIGHS_CALLBACKS:
+            solution = self._solve_highs(cost, matrices, lower, upper,
+                                         integrality, options, callback)
+        else:
+            constraints = []
+            if matrices:
+                constraints = LinearConstraint(sp.vstack(matrices).tocsr(),
+                                               np.concatenate(lower),
+                                               np.concatenate(upper))
+            res = milp(cost if self.sense == pe.minimize else -cost,
+                       integrality=integrality,
+                       bounds=Bounds(np.concatenate(self._lb),
+                                     np.concatenate(self._ub)),
+                       constraints=constraints, options=options)
+            self.success = res.success
+            solution = res.x
+        if solution is None:
+            self.solution = None
+            self._objective = None
+            return False
+        solution = solution.copy()
+        solution[integrality == 1] = np.round(solution[integrality == 1])
+        self.solution = solution
+        self._objective = float(cost @ solution)
+        if callback is not None and not _HIGHS_CALLBACKS:
+            callback(solution, self._objective)
+        return self.success
+
+    def _solve_highs(self, cost, matrices, lower, upper, integrality,
+                     options, callback):
+        # Solve the mixed-integer program with highspy, calling the callback
+        # with each improving solution. Return the best solution, if any.
+        num_vars = len(cost)
+        if matrices:
+            mat = sp.vstack(matrices).tocsc()
+        else:
+            mat = sp.csc_matrix((0, num_vars))
+        lp = highspy.HighsLp()
+        lp.num_col_ = num_vars
+        lp.num_row_ = mat.shape[0]
+        lp.col_cost_ = cost
+        lp.col_lower_ = np.concatenate(self._lb)
+        lp.col_upper_ = np.concatenate(self._ub)
+        lp.row_lower_ = np.concatenate(lower) if matrices else np.zeros(0)
+        lp.row_upper_ = np.concatenate(upper) if matrices else np.zeros(0)
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.num_col_ = num_vars
+        lp.a_matrix_.num_row_ = mat.shape[0]
+        lp.a_matrix_.start_ = mat.indptr
+        lp.a_matrix_.index_ = mat.indices
+        lp.a_matrix_.value_ = mat.data
+        lp.integrality_ = [highspy.HighsVarType.kInteger if i
+                           else highspy.HighsVarType.kContinuous
+                           for i in integrality]
+        if self.sense == pe.maximize:
+            lp.sense_ = highspy.ObjSense.kMaximize
+
+        def improving_solution(event):
+            solution = np.array(event.data_out.mip_solution)
+            solution[integrality == 1] = np.round(solution[integrality == 1])
+            callback(solution, float(cost @ solution))
+
+        h = highspy.Highs()
+        h.setOptionValue("output_flag", False)
+        for name, value in options.items():
+            h.setOptionValue(name, value)
+        h.passModel(lp)
+        h.cbMipImprovingSolution.subscribe(improving_solution)
+        h.run()
+        self.success = h.getModelStatus() == highspy.HighsModelStatus.kOptimal
+        if not h.getSolution().value_valid:
+            return None
+        return np.array(h.getSolution().col_value)
+
+    def _solve_lp(self, cost, matrices, lower, upper, kept):
+        # Solve the model as a linear program and store duals and reduced
+        # costs. Rows are split into equality and inequality rows.
+        num_vars = len(cost)
+        if matrices:
+            mat = sp.vstack(matrices).tocsr()
+            lower = np.concatenate(lower)
+            upper = np.concatenate(upper)
+        else:
+            mat = sp.csr_matrix((0, num_vars))
+            lower = upper = np.zeros(0)
+        eq = lower == upper
+        up = ~eq & np.isfinite(upper)
+        lo = ~eq & np.isfinite(lower)
+        sign = 1.0 if self.sense == pe.minimize else -1.0
+        res = linprog(sign * cost,
+                      A_ub=sp.vstack([mat[up], -mat[lo]]).tocsr(),
+                      b_ub=np.concatenate([upper[up], -lower[lo]]),
+                      A_eq=mat[eq], b_eq=lower[eq],
+                      bounds=np.column_stack([np.concatenate(self._lb),
+                                              np.concatenate(self._ub)]),
+                      method="highs")
+        self.success = res.status == 0
+        if res.x is None:
+            self.solution = None
+            self._objective = None
+            return False
+        self.solution = res.x.copy()
+        self._objective = float(cost @ self.solution)
+
+        # Duals of the rows kept, zero for the rows removed:
+        duals = np.zeros(len(lower))
+        duals[eq] = res.eqlin.marginals
+        duals[up] += res.ineqlin.marginals[:up.sum()]
+        duals[lo] -= res.ineqlin.marginals[up.sum():]
+        duals *= sign
+        self.duals = {}
+        start = 0
+        for name, keep in zip(self._rows, kept):
+            block = np.zeros(len(keep))
+            block[keep] = duals[start:start + keep.sum()]
+            self.duals[name] = block
+            start += keep.sum()
+        self.reduced_costs = sign * (res.lower.marginals
+                                     + res.upper.marginals)
+        return self.success
+
+    def set_solution(self, solution, objective):
+        """Set solution and objective value computed by other means.
+
+        A solution of None marks the model as not solved.
+        """
+        self.success = solution is not None
+        self.solution = None
+        self._objective = None
+        if self.success:
+            self.solution = np.asarray(solution, dtype=float)
+            self._objective = float(objective)
+        self.duals = None
+        self.reduced_costs = None
+
+    def OBJ(self):  # pylint: disable=invalid-name
+        """Return objective value of the solution."""
+        return self._objective
@@ -37,30 +37,81 @@
 """Provides a max-flow network interdiction model."""
 
 import logging
+import time
+import numpy as np
 import pyomo
 import pyomo.opt
 import pyomo.environ as pe
-from snram.topology import NetworkTopology
+from snram.graph import FlowNetwork
+from snram.network_index import NetworkIndex
+from snram.matrix_model import MatrixModel
+from snram.interdiction_result import InterdictionResult, var_values, \
+    constraint_duals, link_criticality
+from snram.solver import ModelSolver
+from snram.interdiction_base import Interdiction
 
+# Number of candidate links evaluated in each step of the greedy solver:
+GREEDY_CANDIDATES = 10
 
-class MaxFlowInterdiction:
+
+class MaxFlowInterdiction(Interdiction):
     """Class to compute max-flow network interdiction."""
 
-    def __init__(self, topology, attacks=0, solver="cplex", tee=False):
-        self._topology = None
-        if isinstance(topology, NetworkTopology):
-            self._topology = topology
-        elif isinstance(topology, str):  # filename is provided
-            self._topology = NetworkTopology(topology)
+    def __init__(self, topology, attacks=0, solver="cplex", tee=False,
+                 warmstart=False, native_primal=False, cache=None,
+                 time_limit=None, mip_gap=None, callback=None,
+                 source="Source", target="Target"):
+        """Initialise max-flow interdiction.
+
+        The flow is sent from the source to the target node; these can be
+        changed between solves with set_od().
+
+        With solver="scipy", the models are assembled in matrix form and
+        solved with HiGHS through SciPy instead of through Pyomo. With
+        solver="combinatorial", the interdiction is found by branch and
+        bound over sets of interdicted links, using max-flow computations
+        only; this is fast for small numbers of attacks. With
+        solver="greedy", the links are interdicted one at a time, each the
+        link of a min cut whose interdiction reduces the max flow the most
+        (of the GREEDY_CANDIDATES links of the cut with the most flow).
+        This heuristic scales to networks too large for the MILP; the
+        objective is the exact max flow after its interdiction, but need
+        not be optimal. The dual objective is then the same.
+
+        With native_primal=True, the flows after interdiction are computed
+        with push-relabel instead of solving the primal linear program.
+        Dual values of the primal are then not available.
+
+        Warm starts, the cache, time limits, MIP gaps and callbacks are
+        described in Interdiction.
+        """
+        super().__init__(topology, attacks, solver, tee, warmstart,
+                         native_primal, cache, time_limit, mip_gap, callback)
+
+        if solver == "decomposition":
+            raise AttributeError("decomposition solver is only available "
+                                 "for shortest-path interdiction")
+
+        self._index = NetworkIndex(self._topology)
+        for node in (source, target):
+            if node not in self._index.node_pos:
+                raise AttributeError("unknown node provided: " + str(node))
+        self._source = source
+        self._target = target
+        self._changed_nodes = []  # nodes with terminals changed by set_od()
+        if self._solver in ("combinatorial", "greedy"):
+            self._primal, self._idual = self._create_flow_network()
         else:
-            raise AttributeError("unknown topology provided")
-
-        self._attacks = attacks
-        self._solver = solver
-        self._tee = tee
-
-        self._primal = self._create_primal()
-        self._idual = self._create_interdict_dual()
+            if self._native_primal:
+                self._primal = self._create_native_primal()
+            elif self._solver == "scipy":
+                self._primal = self._create_matrix_primal()
+            else:
+                self._primal = self._create_primal()
+            if self._solver == "scipy":
+                self._idual = self._create_matrix_interdict_dual()
+            else:
+                self._idual = self._create_interdict_dual()
 
     def _create_primal(self):
         # Create the primal pyomo model.
@@ -81,31 +132,35 @@ class MaxFlowInterdiction:
         model.y = pe.Var(model.edge_set, domain=pe.NonNegativeReals)
         model.v = pe.Var(domain=pe.NonNegativeReals)
 
+        # Interdictions are mutable so that the model can be re-solved:
+        model.xbar = pe.Param(model.edge_set, mutable=True, initialize=dict(
+            zip(self._index.links, self._topology.link_data["xbar"])))
+
+        # Terminals are mutable so that the model can be re-solved for other
+        # source and target nodes (-1 for the source, 1 for the target):
+        model.terminal = pe.Param(model.node_set, mutable=True,
+                                  initialize=self._terminals())
+
         # Create the objective:
         def obj_rule(model):
-            return model.v - 1.1 * sum(data["xbar"] * model.y[e]
-                                       for e, data in self._topology.link_data.iterrows())
+            return model.v - 1.1 * sum(model.xbar[e] * model.y[e]
+                                       for e in self._index.links)
         model.OBJ = pe.Objective(rule=obj_rule, sense=pe.maximize)
 
         # Create the constraints, one for each node:
         def flow_bal_rule(model, n):
-            tmp = self._topology.link_data.reset_index()
-            successors = tmp.loc[tmp.start_node == n, "end_node"].values
-            predecessors = tmp.loc[tmp.end_node == n, "start_node"].values
-            lhs = sum(model.y[(i, n)] for i in predecessors) - \
-                sum(model.y[(n, i)] for i in successors)
-            start_node = int(n == "Source")
-            end_node = int(n == "Target")
-            rhs = 0 - model.v * (start_node) + model.v * (end_node)
-            constr = (lhs == rhs)
+            links = self._index.links
+            lhs = sum(model.y[links[k]] for k in self._index.links_to(n)) - \
+                sum(model.y[links[k]] for k in self._index.links_from(n))
+            constr = (lhs == model.v * model.terminal[n])
             if isinstance(constr, bool):
-                return pe.Constraint
+                return pe.Constraint.Skip
             return constr
         model.FlowBalance = pe.Constraint(model.node_set, rule=flow_bal_rule)
 
         # Capacity constraints, one for each edge:
         def capacity_rule(model, i, j):
-            capacity = self._topology.link_data["capacity"].get((i, j), -1)
+            capacity = self._index.capacity[self._index.link_pos[(i, j)]]
             if capacity < 0:
                 return pe.Constraint.Skip
             return model.y[(i, j)] <= capacity
@@ -130,51 +185,402 @@ class MaxFlowInterdiction:
 
         # Create the objective:
         def obj_rule(model):
-            return sum(data["capacity"] * model.pi[e]
-                       for e, data in self._topology.link_data.iterrows()
-                       if data["capacity"] >= 0)
+            return sum(capacity * model.pi[e]
+                       for e, capacity in zip(self._index.links,
+                                              self._index.capacity)
+                       if capacity >= 0)
         model.OBJ = pe.Objective(rule=obj_rule, sense=pe.minimize)
 
         # Create the constraints for y_ij:
         def edge_constraint_rule(model, i, j):
-            attackable = int(
-                self._topology.link_data["attackable"].get((i, j), 0))
-            has_cap = int(
-                self._topology.link_data["capacity"].get((i, j), -1) >= 0)
+            pos = self._index.link_pos[(i, j)]
+            attackable = int(self._index.attackable[pos])
+            has_cap = int(self._index.capacity[pos] >= 0)
             return model.rho[j] - model.rho[i] + model.pi[(i, j)] * has_cap >= \
                 0 - 1.1 * model.x[(i, j)] * attackable
         model.DualEdgeConstraint = pe.Constraint(
             model.edge_set, rule=edge_constraint_rule)
 
+        # Terminals are mutable as for the primal:
+        model.terminal = pe.Param(model.node_set, mutable=True,
+                                  initialize=self._terminals())
+
         # Set the x's for non-blockable arcs:
         def v_constraint_rule(model):
-            return model.rho["Source"] - model.rho["Target"] == 1
+            return sum(model.terminal[n] * model.rho[n]
+                       for n in model.node_set) == -1
         model.VConstraint = pe.Constraint(rule=v_constraint_rule)
 
         # Create the interdiction budget constraint:
-        def block_limit_rule(model):
-            model.attacks = self._attacks
-            return pe.summation(model.x) <= model.attacks  # pylint: disable=no-member
-        model.BlockLimit = pe.Constraint(rule=block_limit_rule)
+        model.attacks = pe.Param(mutable=True, initialize=self._attacks)
+        model.BlockLimit = pe.Constraint(
+            expr=pe.summation(model.x) <= model.attacks)
 
         # Return the model:
         return model
 
-    def set_attacks(self, attacks):
-        """Set number of attacks."""
-        self._attacks = attacks
+    def _create_matrix_primal(self):
+        # Create the primal model in matrix form.
+        index = self._index
+        num_edges = len(index.edges)
+        capacity = np.array(index.capacity, dtype=float)[index.edge_link]
+
+        model = MatrixModel(pe.maximize)
+        model.add_var("y", index.edges,
+                      ub=np.where(capacity >= 0, capacity, np.inf))
+        model.add_var("v", [None], cost=1.0)
+        self._add_flow_balance(model)
+
+        # Cost of flow on interdicted edges is set when solving:
+        self._multiplicity = np.bincount(index.link_edge, minlength=num_edges)
+        return model
+
+    def _add_flow_balance(self, model):
+        # Add flow balance to the primal in matrix form; flow in - flow out
+        # + v (source) - v (target) = 0. It replaces the previous one.
+        index = self._index
+        rows, cols, vals = index.incidence()
+        terminals = [index.node_pos[self._source],
+                     index.node_pos[self._target]]
+        model.add_constraints(
+            "FlowBalance", len(index.nodes),
+            np.concatenate([rows, terminals]),
+            np.concatenate([model.column("y", cols),
+                            model.column("v", [0, 0])]),
+            np.concatenate([vals, [1.0, -1.0]]), 0.0, 0.0)
+
+    def _create_matrix_interdict_dual(self):
+        # Create the interdiction model in matrix form.
+        index = self._index
+        num_edges = len(index.edges)
+        capacity = np.array(index.capacity, dtype=float)
+        has_cap = (capacity >= 0)[index.edge_link]
+        attackable = np.array(index.attackable, dtype=float)[index.edge_link]
+
+        model = MatrixModel(pe.minimize)
+        model.add_var("rho", index.nodes, lb=-np.inf)
+        model.add_var("pi", index.edges, cost=np.bincount(
+            index.link_edge, weights=np.where(capacity >= 0, capacity, 0.0),
+            minlength=num_edges))
+        model.add_var("x", index.edges, ub=1.0, integer=True)
+
+        # Edge constraints; rho_j - rho_i + pi_ij + 1.1 x_ij >= 0:
+        edges = np.arange(num_edges)
+        start = index.start[index.edge_link]
+        end = index.end[index.edge_link]
+        model.add_constraints(
+            "DualEdgeConstraint", num_edges,
+            np.tile(edges, 4),
+            np.concatenate([model.column("rho", end),
+                            model.column("rho", start),
+                            model.column("pi", edges),
+                            model.column("x", edges)]),
+            np.concatenate([np.ones(num_edges), -np.ones(num_edges),
+                            has_cap, 1.1 * attackable]), 0.0, np.inf)
+
+        self._add_v_constraint(model)
+
+        # Interdiction budget:
+        model.add_constraints(
+            "BlockLimit", 1, np.zeros(num_edges), model.column("x", edges),
+            np.ones(num_edges), -np.inf, self._attacks)
+        return model
+
+    def _add_v_constraint(self, model):
+        # Add rho_source - rho_target = 1 to the interdiction model in matrix
+        # form. It replaces the previous one.
+        index = self._index
+        model.add_constraints(
+            "VConstraint", 1, [0, 0],
+            model.column("rho", [index.node_pos[self._source],
+                                 index.node_pos[self._target]]),
+            [1.0, -1.0], 1.0, 1.0)
+
+    def _create_native_primal(self):
+        # Create the flow network for computing flows after interdiction,
+        # and a model holding the flows.
+        index = self._index
+        self._network = FlowNetwork(
+            len(index.nodes), index.start[index.edge_link],
+            index.end[index.edge_link],
+            np.array(index.capacity, dtype=float)[index.edge_link])
+
+        primal = MatrixModel(pe.maximize)
+        primal.add_var("y", index.edges)
+        primal.add_var("v", [None])
+        return primal
+
+    def _create_flow_network(self):
+        # Create the flow network for the combinatorial and greedy solvers,
+        # and models holding their solutions.
+        index = self._index
+        primal = self._create_native_primal()
+        self._attackable = \
+            np.array(index.attackable, dtype=float)[index.edge_link] > 0
+
+        idual = MatrixModel(pe.minimize)
+        idual.add_var("x", index.edges, ub=1.0, integer=True)
+        return primal, idual
+
+    def _solve_combinatorial(self):
+        # Solve the interdiction problem by depth-first branch and bound
+        # over sets of interdicted edges.
+        #
+        # An interdiction can only reduce the max flow if it removes an edge
+        # carrying flow. Each set is therefore branched on the attackable
+        # edges with flow, e1, e2, ..., where branch i interdicts ei and
+        # excludes e1, ..., ei-1 from being interdicted. Removing edges
+        # reduces the max flow by at most their flows. A stronger bound
+        # with r more attacks is the min cut with the capacities of the
+        # edges that can be interdicted truncated at t, less r t, maximised
+        # over t (Lagrangian bound). Interdicting the edges with the largest
+        # capacities in each of these min cuts gives the incumbents.
+        network = self._network
+        source = self._index.node_pos[self._source]
+        target = self._index.node_pos[self._target]
+        start = self._index.start[self._index.edge_link]
+        end = self._index.end[self._index.edge_link]
+        best = [np.inf, frozenset(), None]
+
+        def tolerance():
+            # Return tolerance for comparing with the incumbent, within
+            # which branches are pruned.
+            return max(1.0e-9 * max(1.0, abs(best[0])),
+                       (self._mip_gap or 0.0) * abs(best[0]))
+
+        def evaluate(interdicted):
+            # Return max flow after interdiction and update the incumbent.
+            value, flow, cut = network.max_flow(source, target, interdicted)
+            if value < best[0] - 1.0e-9 * max(1.0, abs(value)):
+                best[:] = [value, interdicted, flow]
+                x = np.zeros(len(self._index.edges))
+                x[list(interdicted)] = 1.0
+                self._report(x, value)
+            return value, flow, cut
+
+        def cut_bound(interdicted, allowed, remaining):
+            # Return the Lagrangian bound by ternary search over t, as it is
+            # concave in t.
+            thresholds = np.unique(np.append(network.capacity[allowed], 0.0))
+            bounds = {}
+
+            def bound(i):
+                if i not in bounds:
+                    value, _, cut = network.max_flow(
+                        source, target, interdicted,
+                        np.where(allowed, np.minimum(network.capacity,
+                                                     thresholds[i]),
+                                 network.capacity))
+                    crossing = np.flatnonzero(cut[start] & ~cut[end]
+                                              & allowed)
+                    crossing = crossing[np.argsort(
+                        -network.capacity[crossing], kind="stable")]
+                    if best[0] > 0:
+                        evaluate(interdicted
+                                 | frozenset(crossing[:remaining].tolist()))
+                    bounds[i] = value - remaining * thresholds[i]
+                return bounds[i]
+
+            low, high = 0, len(thresholds) - 1
+            while high - low > 2:
+                left = low + (high - low) // 3
+                right = high - (high - low) // 3
+                if bound(left) < bound(right):
+                    low = left + 1
+                else:
+                    high = right
+            return max(bound(i) for i in range(low, high + 1))
+
+        if self._cutoff() is not None:
+            # Warm start from the previous interdiction:
+            evaluate(frozenset(
+                np.flatnonzero(self._idual.x.values() > 0).tolist()))
+
+        stack = [(frozenset(), self._attackable)]
+        while stack:
+            interdicted, allowed = stack.pop()
+            value, flow, _ = evaluate(interdicted)
+            if self._timed_out():
+                break
+            remaining = self._attacks - len(interdicted)
+            if remaining <= 0:
+                continue
+            candidates = np.flatnonzero(allowed & (flow > 0))
+            candidates = candidates[np.argsort(-flow[candidates],
+                                               kind="stable")]
+            if value - flow[candidates[:remaining]].sum() \
+                    >= best[0] - tolerance():
+                continue
+            if cut_bound(interdicted, allowed, remaining) \
+                    >= best[0] - tolerance():
+                continue
+            for i in range(len(candidates) - 1, -1, -1):
+                child = allowed.copy()
+                child[candidates[:i + 1]] = False
+                stack.append((interdicted | {candidates[i]}, child))
+
+        best_value, best_set, best_flow = best
+        x = np.zeros(len(self._index.edges))
+        x[list(best_set)] = 1.0
+        self._idual.set_solution(x, best_value)
+        self._primal.set_solution(np.append(best_flow, best_value),
+                                  best_value)
+        self._incumbent = (self._attacks, best_value)
+        self._topology.link_data["xbar"] = x[self._index.link_edge]
+
+    def _solve_greedy(self):
+        # Interdict one edge at a time until the attacks are spent or the
+        # flow is zero. The attackable edges crossing a min cut with the
+        # largest flows are candidates, and the candidate leaving the
+        # smallest max flow is interdicted.
+        network = self._network
+        source = self._index.node_pos[self._source]
+        target = self._index.node_pos[self._target]
+        start = self._index.start[self._index.edge_link]
+        end = self._index.end[self._index.edge_link]
+        x = np.zeros(len(self._index.edges))
+        for _ in range(self._attacks):
+            if self._timed_out():
+                break
+            value, flow, cut = network.max_flow(source, target,
+                                                np.flatnonzero(x))
+            crossing = np.flatnonzero(cut[start] & ~cut[end]
+                                      & self._attackable & (x == 0))
+            if value <= 0 or len(crossing) == 0:
+                break
+            crossing = crossing[np.argsort(-flow[crossing], kind="stable")]
+            values = [network.max_flow(source, target,
+                                       np.append(np.flatnonzero(x), e))[0]
+                      for e in crossing[:GREEDY_CANDIDATES]]
+            x[crossing[np.argmin(values)]] = 1.0
+            self._report(x, min(values))
+
+        self._solve_native_primal(x)
+        if not x.any():
+            self._report(x, self._primal.OBJ())
+        self._idual.set_solution(x, self._primal.OBJ())
+        self._incumbent = (self._attacks, self._primal.OBJ())
+        self._topology.link_data["xbar"] = x[self._index.link_edge]
+
+    def _solve_matrix(self):
+        # Solve the interdiction problem in matrix form.
+        self._idual.set_bounds("BlockLimit", -np.inf, self._attacks)
+        callback = None
+        if self._callback is not None:
+            callback = self._report_matrix
+        if not self._idual.solve(cutoff=self._cutoff(),
+                                 time_limit=self._remaining_time(),
+                                 mip_gap=self._mip_gap, callback=callback):
+            logging.warning("Check solver optimality")
+        if self._idual.solution is None:
+            return
+        self._incumbent = (self._attacks, self._idual.OBJ())
+
+        # Put interdiction into xbar and solve primal:
+        xbar = self._idual.x.values()
+        self._topology.link_data["xbar"] = xbar[self._index.link_edge]
+        if self._native_primal:
+            self._solve_native_primal(xbar)
+            return
+        self._primal.set_cost("y", -1.1 * xbar * self._multiplicity)
+        if not self._primal.solve():
+            logging.warning("Check solver optimality")
+
+    def _solve_native_primal(self, xbar):
+        # Compute the max flow after interdiction. Flow on interdicted edges
+        # is penalised by more than its value in the primal, so these edges
+        # are removed.
+        value, flow, _ = self._network.max_flow(
+            self._index.node_pos[self._source],
+            self._index.node_pos[self._target],
+            np.flatnonzero(xbar > 0.5))
+        self._primal.set_solution(np.append(flow, value), value)
+
+    def _args(self):
+        # Return constructor arguments of a model in the current state.
+        return super()._args() + (self._source, self._target)
+
+    def set_od(self, source, target):
+        """Set source and target nodes of the flow.
+
+        Only the terms of the models depending on these are changed. The
+        previous solution is not used to warm start the next solve.
+        """
+        for node in (source, target):
+            if node not in self._index.node_pos:
+                raise AttributeError("unknown node provided: " + str(node))
+        changed = [self._source, self._target, source, target]
+        self._source = source
+        self._target = target
+        self._incumbent = None
+        if self._solver == "scipy":
+            self._add_v_constraint(self._idual)
+            if not self._native_primal:
+                self._add_flow_balance(self._primal)
+        elif self._solver not in ("combinatorial", "greedy"):
+            self._idual.terminal.store_values(self._terminals())
+            if not self._native_primal:
+                self._primal.terminal.store_values(self._terminals())
+            self._changed_nodes += changed
+
+    def _terminals(self):
+        # Return -1 for the source, 1 for the target and 0 for other nodes.
+        terminals = dict.fromkeys(self._index.nodes, 0)
+        terminals[self._source] = -1
+        terminals[self._target] = 1
+        return terminals
 
     def solve(self):
         """Solve the max-flow interdiction problem."""
-        solver = pyomo.opt.SolverFactory(self._solver)
+        self._start = time.perf_counter()
+        key = None
+        if self._cache is not None:
+            key = self._cache.key(self._index, "max-flow", self._attacks,
+                                  self._solver, self._native_primal,
+                                  self._time_limit, self._mip_gap,
+                                  self._source, self._target)
+        if key is None or not self._load_cached(key):
+            if self._solver == "combinatorial":
+                self._solve_combinatorial()
+            elif self._solver == "greedy":
+                self._solve_greedy()
+            elif self._solver == "scipy":
+                self._solve_matrix()
+            else:
+                self._solve_model()
+            if key is not None:
+                self._cache.save(key, self._primal, self._idual)
+        self.solve_time = time.perf_counter() - self._start
+        return self._primal, self._idual
+
+    def _solve_model(self):
+        # Solve the interdiction problem with Pyomo.
+        if self._idual_solver is None:
+            self._idual_solver = ModelSolver(
+                self._idual, self._solver, self._tee)
+            if not self._native_primal:
+                self._primal_solver = ModelSolver(
+                    self._primal, self._solver, self._tee)
+
+        # Constraints changed by set_od():
+        updated = [self._idual.BlockLimit]
+        updated_primal = [self._primal.OBJ]
+        if self._changed_nodes:
+            updated.append(self._idual.VConstraint)
+            if not self._native_primal:
+                updated_primal += [self._primal.FlowBalance[n]
+                                   for n in set(self._changed_nodes)
+                                   if n in self._primal.FlowBalance]
+            self._changed_nodes = []
 
         # Solve the dual first:
-        self._idual.BlockLimit.construct()
-        self._idual.BlockLimit._constructed = False  # pylint: disable=protected-access
-        del self._idual.BlockLimit._data[None]  # pylint: disable=protected-access
-        self._idual.BlockLimit.reconstruct()
-        self._idual.preprocess()
-        results = solver.solve(self._idual, tee=self._tee)
+        self._idual.attacks = self._attacks
+        cutoff = self._cutoff()
+        results = self._idual_solver.solve(updated,
+                                           warmstart=cutoff is not None,
+                                           cutoff=cutoff,
+                                           time_limit=self._remaining_time(),
+                                           mip_gap=self._mip_gap)
 
         # Check that we actually computed an optimal solution:
         if results.solver.status != pyomo.opt.SolverStatus.ok:
@@ -184,17 +590,17 @@ class MaxFlowInterdiction:
 
         # Put interdiction into xbar and solve primal:
         self._idual.solutions.load_from(results)
+        self._incumbent = (self._attacks, pe.value(self._idual.OBJ))
 
-        for e in self._topology.link_data.index:
-            self._topology.link_data.loc[e, "xbar"] = self._idual.x[e].value
+        xbar = var_values(self._idual.x)
+        self._report(xbar, pe.value(self._idual.OBJ))
+        self._topology.link_data["xbar"] = xbar[self._index.link_edge]
+        if self._native_primal:
+            self._solve_native_primal(xbar)
+            return
+        self._primal.xbar.store_values(dict(zip(self._index.edges, xbar)))
 
-        self._primal.OBJ.construct()
-        self._primal.OBJ._constructed = False  # pylint: disable=protected-access
-        self._primal.OBJ._init_sense = pe.maximize  # pylint: disable=protected-access
-        del self._primal.OBJ._data[None]  # pylint: disable=protected-access
-        self._primal.OBJ.reconstruct()
-        self._primal.preprocess()
-        results = solver.solve(self._primal, tee=self._tee)
+        results = self._primal_solver.solve(updated_primal)
 
         # Check that we have computed an optimal solution:
         if results.solver.status != pyomo.opt.SolverStatus.ok:
@@ -205,28 +611,77 @@ class MaxFlowInterdiction:
         # Load results:
         self._primal.solutions.load_from(results)
 
-        # Return results:
-        return self._primal, self._idual
-
-    def print(self):
-        """Print solution."""
-        edges = sorted(self._topology.link_set)
+    def result(self):
+        """Return solution as an InterdictionResult.
+
+        The values are extracted from the models as arrays, together with
+        the duals of the primal if the solver provided them.
+        """
+        index = self._index
+        kwargs = {}
+        if isinstance(self._primal, MatrixModel):
+            if self._primal.duals is not None:
+                kwargs["node_dual"] = self._primal.duals["FlowBalance"]
+        else:
+            kwargs["node_dual"] = constraint_duals(
+                self._primal, self._primal.FlowBalance, index.nodes)
+            kwargs["link_dual"] = constraint_duals(
+                self._primal, self._primal.Capacity, index.edges)
+        return InterdictionResult(
+            self._attacks, index.edges, index.nodes,
+            var_values(self._idual.x), var_values(self._primal.y),
+            primal=self._primal.OBJ(), dual=self._idual.OBJ(),
+            time=self.solve_time, **kwargs)
+
+    def criticality(self):
+        """Return attackable links ranked by criticality.
+
+        The primal is solved without interdiction, and then with each
+        attackable link carrying flow cut in turn; the links are ranked by
+        the loss of the objective, and the reduced cost of the bound on
+        the cut flow is given as the price (see link_criticality()). This
+        is a screen with linear programs only before solving the
+        interdiction problem. The primal is solved in matrix form with
+        HiGHS through SciPy for any solver.
+        """
+        primal = self._create_matrix_primal()
+        if not primal.solve():
+            logging.warning("Check solver optimality")
+        return link_criticality(self._index, primal)
+
+    def solution(self):
+        """Return solution as a record.
+
+        The record is a dict with the number of attacks, the interdicted
+        links, the flow on each link, the primal and dual objectives and
+        the solve time.
+        """
+        result = self.result()
+        record = {"attacks": self._attacks}
+        record["interdicted"] = result.interdicted()
+        record["flows"] = list(zip(result.edges, result.flow.tolist()))
+        record["primal"] = result.primal
+        record["dual"] = result.dual
+        record["time"] = result.time
+        return record
+
+    @staticmethod
+    def print_solution(record):
+        """Print solution record."""
         print("%s" % ("-" * 70))
-        print("Number of attacks: %d" % self._attacks)
+        print("Number of attacks: %d" % record["attacks"])
         print("%s" % ("-" * 70))
-        it = 0
-        for e in edges:
-            if self._idual.x[e].value > 0:
-                it += 1
-                eij = "(" + str(e[0]) + ", " + str(e[1]) + ")"
-                print("Interdicted link %d: %s" % (it, eij))
+        for it, e in enumerate(record["interdicted"]):
+            eij = "(" + str(e[0]) + ", " + str(e[1]) + ")"
+            print("Interdicted link %d: %s" % (it + 1, eij))
         print("%s" % ("-" * 70))
         print("Link\t\tFlow")
         print("%-12s" % ("-" * 70))
-        for ei, ej in self._topology.link_set:
-            flow = self._primal.y[(ei, ej)].value
+        for (ei, ej), flow in record["flows"]:
             eij = "(" + str(ei) + ", " + str(ej) + ")"
             print("%-12s\t%.2f" % (eij, flow))
         print("%s" % ("-" * 70))
         print("Total flow: %.2f (primal), %.2f (dual)" %
-              (self._primal.OBJ(), self._idual.OBJ()))
+              (record["primal"], record["dual"]))
+        if record.get("time") is not None:
+            print("Solve time: %.2f s" % record["time"])
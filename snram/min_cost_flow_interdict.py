@@ -37,34 +37,72 @@
 """Provides min-cost-flow interdiction model."""
 
 import logging
+import time
+import numpy as np
 import pyomo
 import pyomo.opt
 import pyomo.environ as pe
-from snram.topology import NetworkTopology
+from snram.graph import FlowNetwork
+from snram.network_index import NetworkIndex
+from snram.matrix_model import MatrixModel
+from snram.interdiction_result import InterdictionResult, var_values, \
+    constraint_duals, link_criticality
+from snram.solver import ModelSolver
+from snram.interdiction_base import Interdiction
 
+# Number of candidate links evaluated in each step of the greedy solver:
+GREEDY_CANDIDATES = 10
 
-class MinCostFlowInterdiction:
-    """Class to compute min-cost-flow interdictions."""
 
-    def __init__(self, topology, attacks=0, solver="cplex", tee=False):
-        self._topology = None
-        if isinstance(topology, NetworkTopology):
-            self._topology = topology
-        elif isinstance(topology, str):  # filename is provided
-            self._topology = NetworkTopology(topology)
-        else:
-            raise AttributeError("unknown topology provided")
+class MinCostFlowInterdiction(Interdiction):
+    """Class to compute min-cost-flow interdictions."""
 
-        self._attacks = attacks
-        self._solver = solver
-        self._tee = tee
+    def __init__(self, topology, attacks=0, solver="cplex", tee=False,
+                 warmstart=False, native_primal=False, cache=None,
+                 time_limit=None, mip_gap=None, callback=None):
+        """Initialise min-cost-flow interdiction.
+
+        With solver="scipy", the models are assembled in matrix form and
+        solved with HiGHS through SciPy instead of through Pyomo. With
+        solver="greedy", the links are interdicted one at a time, each the
+        link whose interdiction increases the cost the most (of the
+        GREEDY_CANDIDATES links with the most flow). This heuristic scales
+        to networks too large for the MILP; the objective is the exact cost
+        of the flow after its interdiction, but need not be optimal. The
+        dual objective is then the same.
+
+        With native_primal=True, the flows after interdiction are computed
+        with successive shortest paths instead of solving the primal linear
+        program. Dual values of the primal are then not available.
+
+        Warm starts, the cache, time limits, MIP gaps and callbacks are
+        described in Interdiction.
+        """
+        super().__init__(topology, attacks, solver, tee, warmstart,
+                         native_primal, cache, time_limit, mip_gap, callback)
+
+        if solver in ("combinatorial", "decomposition"):
+            raise AttributeError("%s solver is not available for "
+                                 "min-cost-flow interdiction" % solver)
 
         # Compute nCmax
         self._nCmax = len(self._topology.node_set) \
-            * self._topology.link_data["risk"].max()
+            * int(self._topology.link_data["risk"].max())
 
-        self._primal = self._create_primal()
-        self._idual = self._create_interdict_dual()
+        self._index = NetworkIndex(self._topology)
+        if self._solver == "greedy":
+            self._primal, self._idual = self._create_greedy()
+        else:
+            if self._native_primal:
+                self._primal = self._create_native_primal()
+            elif self._solver == "scipy":
+                self._primal = self._create_matrix_primal()
+            else:
+                self._primal = self._create_primal()
+            if self._solver == "scipy":
+                self._idual = self._create_matrix_interdict_dual()
+            else:
+                self._idual = self._create_interdict_dual()
 
     def _create_primal(self):
         # Create the primal pyomo model.
@@ -85,22 +123,25 @@ class MinCostFlowInterdiction:
         model.UnsatSupply = pe.Var(model.node_set, domain=pe.NonNegativeReals)
         model.UnsatDemand = pe.Var(model.node_set, domain=pe.NonNegativeReals)
 
+        # Interdictions are mutable so that the model can be re-solved:
+        model.xbar = pe.Param(model.edge_set, mutable=True, initialize=dict(
+            zip(self._index.links, self._topology.link_data["xbar"])))
+
         # Create the objective:
         def obj_rule(model):
-            return sum((data["risk"] + data["xbar"] * (2 * self._nCmax + 1))
-                       * model.y[e] for e, data in self._topology.link_data.iterrows()) \
+            return sum((risk + model.xbar[e] * (2 * self._nCmax + 1))
+                       * model.y[e] for e, risk in zip(self._index.links,
+                                                       self._index.risk)) \
                 + sum(self._nCmax * (model.UnsatSupply[n] + model.UnsatDemand[n])
-                      for n, data in self._topology.node_data.iterrows())
+                      for n in self._index.nodes)
         model.OBJ = pe.Objective(rule=obj_rule, sense=pe.minimize)
 
         # Create the constraints, one for each node:
         def flow_bal_rule(model, n):
-            tmp = self._topology.link_data.reset_index()
-            successors = tmp.loc[tmp.start_node == n, "end_node"].values
-            predecessors = tmp.loc[tmp.end_node == n, "start_node"].values
-            lhs = sum(model.y[(i, n)] for i in predecessors) \
-                - sum(model.y[(n, i)] for i in successors)
-            imbalance = self._topology.node_data["supply_demand"].get(n, 0)
+            links = self._index.links
+            lhs = sum(model.y[links[k]] for k in self._index.links_to(n)) \
+                - sum(model.y[links[k]] for k in self._index.links_from(n))
+            imbalance = self._index.supply_demand[self._index.node_pos[n]]
             supply_node = int(imbalance < 0)
             demand_node = int(imbalance > 0)
             rhs = (imbalance + model.UnsatSupply[n] * supply_node
@@ -113,7 +154,7 @@ class MinCostFlowInterdiction:
 
         # Capacity constraints, one for each edge:
         def capacity_rule(model, i, j):
-            capacity = self._topology.link_data["capacity"].get((i, j), -1)
+            capacity = self._index.capacity[self._index.link_pos[(i, j)]]
             if capacity < 0:
                 return pe.Constraint.Skip
             return model.y[(i, j)] <= capacity
@@ -137,27 +178,29 @@ class MinCostFlowInterdiction:
 
         # Create the objective:
         def obj_rule(model):
-            return sum(data["capacity"]*model.pi[e]
-                       for e, data in self._topology.link_data.iterrows() if data["capacity"] >= 0) \
-                + sum(data["supply_demand"] * model.rho[n]
-                      for n, data in self._topology.node_data.iterrows())
+            return sum(capacity * model.pi[e]
+                       for e, capacity in zip(self._index.links,
+                                              self._index.capacity)
+                       if capacity >= 0) \
+                + sum(imbalance * model.rho[n]
+                      for n, imbalance in zip(self._index.nodes,
+                                              self._index.supply_demand))
         model.OBJ = pe.Objective(rule=obj_rule, sense=pe.maximize)
 
         # Create the constraints for y_ij:
         def edge_constraint_rule(model, i, j):
-            attackable = int(
-                self._topology.link_data["attackable"].get((i, j), 0))
-            has_cap = int(
-                self._topology.link_data["capacity"].get((i, j), -1) >= 0)
+            pos = self._index.link_pos[(i, j)]
+            attackable = int(self._index.attackable[pos])
+            has_cap = int(self._index.capacity[pos] >= 0)
             return model.rho[j] - model.rho[i] + model.pi[(i, j)] * has_cap <= \
-                self._topology.link_data["risk"].get((i, j), 0) \
+                self._index.risk[pos] \
                 + (2 * self._nCmax + 1) * model.x[(i, j)] * attackable
         model.DualEdgeConstraint = pe.Constraint(
             model.edge_set, rule=edge_constraint_rule)
 
         # Create constraints for the UnsatDemand variables:
         def unsat_constraint_rule(model, n):
-            imbalance = self._topology.node_data["supply_demand"].get(n, 0)
+            imbalance = self._index.supply_demand[self._index.node_pos[n]]
             supply_node = int(imbalance < 0)
             demand_node = int(imbalance > 0)
             if supply_node:
@@ -169,29 +212,234 @@ class MinCostFlowInterdiction:
             model.node_set, rule=unsat_constraint_rule)
 
         # Create the interdiction budget constraint:
-        def block_limit_rule(model):
-            model.attacks = self._attacks
-            return pe.summation(model.x) <= model.attacks  # pylint: disable=no-member
-        model.BlockLimit = pe.Constraint(rule=block_limit_rule)
+        model.attacks = pe.Param(mutable=True, initialize=self._attacks)
+        model.BlockLimit = pe.Constraint(
+            expr=pe.summation(model.x) <= model.attacks)
 
         # Return the model
         return model
 
-    def set_attacks(self, attacks):
-        """Set number of attacks."""
-        self._attacks = attacks
+    def _create_matrix_primal(self):
+        # Create the primal model in matrix form.
+        index = self._index
+        num_nodes = len(index.nodes)
+        num_edges = len(index.edges)
+        capacity = np.array(index.capacity, dtype=float)[index.edge_link]
+        imbalance = np.array(index.supply_demand, dtype=float)
+
+        model = MatrixModel(pe.minimize)
+        model.add_var("y", index.edges,
+                      ub=np.where(capacity >= 0, capacity, np.inf))
+        model.add_var("UnsatSupply", index.nodes, cost=self._nCmax)
+        model.add_var("UnsatDemand", index.nodes, cost=self._nCmax)
+
+        # Flow balance; flow in - flow out - UnsatSupply (supply nodes)
+        # + UnsatDemand (demand nodes) = supply_demand:
+        rows, cols, vals = index.incidence()
+        nodes = np.arange(num_nodes)
+        model.add_constraints(
+            "FlowBalance", num_nodes,
+            np.concatenate([rows, nodes, nodes]),
+            np.concatenate([model.column("y", cols),
+                            model.column("UnsatSupply", nodes),
+                            model.column("UnsatDemand", nodes)]),
+            np.concatenate([vals, -1.0 * (imbalance < 0.0),
+                            1.0 * (imbalance > 0.0)]),
+            imbalance, imbalance)
+
+        # Cost of flow on interdicted edges is set when solving:
+        self._risk = np.bincount(index.link_edge, weights=index.risk,
+                                 minlength=num_edges)
+        self._multiplicity = np.bincount(index.link_edge, minlength=num_edges)
+        return model
+
+    def _create_native_primal(self):
+        # Create the flow network for computing flows after interdiction,
+        # and a model holding the flows.
+        index = self._index
+        num_edges = len(index.edges)
+        self._network = FlowNetwork(
+            len(index.nodes), index.start[index.edge_link],
+            index.end[index.edge_link],
+            np.array(index.capacity, dtype=float)[index.edge_link])
+
+        model = MatrixModel(pe.minimize)
+        model.add_var("y", index.edges)
+        model.add_var("UnsatSupply", index.nodes)
+        model.add_var("UnsatDemand", index.nodes)
+
+        self._risk = np.bincount(index.link_edge, weights=index.risk,
+                                 minlength=num_edges)
+        self._multiplicity = np.bincount(index.link_edge, minlength=num_edges)
+        return model
+
+    def _create_matrix_interdict_dual(self):
+        # Create the interdiction model in matrix form.
+        index = self._index
+        num_edges = len(index.edges)
+        imbalance = np.array(index.supply_demand, dtype=float)
+        capacity = np.array(index.capacity, dtype=float)
+        has_cap = (capacity >= 0)[index.edge_link]
+        attackable = np.array(index.attackable, dtype=float)[index.edge_link]
+        risk = np.array(index.risk, dtype=float)[index.edge_link]
+
+        # The unsatisfied supply and demand constraints are bounds on rho:
+        model = MatrixModel(pe.maximize)
+        model.add_var("rho", index.nodes, cost=imbalance,
+                      lb=np.where(imbalance < 0.0, -self._nCmax, -np.inf),
+                      ub=np.where(imbalance > 0.0, self._nCmax, np.inf))
+        model.add_var("pi", index.edges, lb=-np.inf, ub=0.0, cost=np.bincount(
+            index.link_edge, weights=np.where(capacity >= 0, capacity, 0.0),
+            minlength=num_edges))
+        model.add_var("x", index.edges, ub=1.0, integer=True)
+
+        # Edge constraints; rho_j - rho_i + pi_ij - (2 nCmax + 1) x_ij <= risk_ij:
+        edges = np.arange(num_edges)
+        start = index.start[index.edge_link]
+        end = index.end[index.edge_link]
+        model.add_constraints(
+            "DualEdgeConstraint", num_edges,
+            np.tile(edges, 4),
+            np.concatenate([model.column("rho", end),
+                            model.column("rho", start),
+                            model.column("pi", edges),
+                            model.column("x", edges)]),
+            np.concatenate([np.ones(num_edges), -np.ones(num_edges), has_cap,
+                            -(2 * self._nCmax + 1) * attackable]),
+            -np.inf, risk)
+
+        # Interdiction budget:
+        model.add_constraints(
+            "BlockLimit", 1, np.zeros(num_edges), model.column("x", edges),
+            np.ones(num_edges), -np.inf, self._attacks)
+        return model
+
+    def _solve_matrix(self):
+        # Solve the interdiction problem in matrix form.
+        self._idual.set_bounds("BlockLimit", -np.inf, self._attacks)
+        callback = None
+        if self._callback is not None:
+            callback = self._report_matrix
+        if not self._idual.solve(cutoff=self._cutoff(),
+                                 time_limit=self._remaining_time(),
+                                 mip_gap=self._mip_gap, callback=callback):
+            logging.warning("Check solver optimality")
+        if self._idual.solution is None:
+            return
+        self._incumbent = (self._attacks, self._idual.OBJ())
+
+        # Put interdictions into xbar and solve primal:
+        xbar = self._idual.x.values()
+        self._topology.link_data["xbar"] = xbar[self._index.link_edge]
+        if self._native_primal:
+            self._solve_native_primal(xbar)
+            return
+        self._primal.set_cost("y", self._risk + xbar * self._multiplicity
+                              * (2 * self._nCmax + 1))
+        if not self._primal.solve():
+            logging.warning("Check solver optimality")
+
+    def _create_greedy(self):
+        # Create the flow network for the greedy solver, and models holding
+        # its solution.
+        index = self._index
+        primal = self._create_native_primal()
+        self._attackable = \
+            np.array(index.attackable, dtype=float)[index.edge_link] > 0
+
+        idual = MatrixModel(pe.maximize)
+        idual.add_var("x", index.edges, ub=1.0, integer=True)
+        return primal, idual
+
+    def _solve_greedy(self):
+        # Interdict one edge at a time until the attacks are spent or no
+        # flow is left. The attackable edges with the largest flows (ties
+        # broken by the largest risk) are candidates, and the candidate
+        # giving the largest cost is interdicted.
+        x = np.zeros(len(self._index.edges))
+        for _ in range(self._attacks):
+            if self._timed_out():
+                break
+            self._solve_native_primal(x)
+            flow = self._primal.y.values()
+            candidates = np.flatnonzero((flow > 0) & self._attackable
+                                        & (x == 0))
+            if len(candidates) == 0:
+                break
+            candidates = candidates[np.lexsort(
+                (-self._risk[candidates], -flow[candidates]))]
+            costs = []
+            for e in candidates[:GREEDY_CANDIDATES]:
+                x[e] = 1.0
+                self._solve_native_primal(x)
+                costs.append(self._primal.OBJ())
+                x[e] = 0.0
+            x[candidates[np.argmax(costs)]] = 1.0
+            self._report(x, max(costs))
+
+        self._solve_native_primal(x)
+        if not x.any():
+            self._report(x, self._primal.OBJ())
+        self._idual.set_solution(x, self._primal.OBJ())
+        self._incumbent = (self._attacks, self._primal.OBJ())
+        self._topology.link_data["xbar"] = x[self._index.link_edge]
+
+    def _solve_native_primal(self, xbar):
+        # Compute the min-cost flow after interdiction. Supply and demand
+        # left unsatisfied cost nCmax per unit each, so units are only sent
+        # along paths costing less than 2 nCmax.
+        network = self._network
+        imbalance = np.array(self._index.supply_demand, dtype=float)
+        cost = self._risk + xbar * self._multiplicity * (2 * self._nCmax + 1)
+        flow = network.min_cost_flow(cost, imbalance, 2 * self._nCmax)
+        net = np.bincount(network.end_node, weights=flow,
+                          minlength=network.num_nodes) \
+            - np.bincount(network.start_node, weights=flow,
+                          minlength=network.num_nodes)
+        unsat_supply = np.where(imbalance < 0, net - imbalance, 0.0)
+        unsat_demand = np.where(imbalance > 0, imbalance - net, 0.0)
+        self._primal.set_solution(
+            np.concatenate([flow, unsat_supply, unsat_demand]),
+            cost @ flow + self._nCmax * (unsat_supply.sum()
+                                         + unsat_demand.sum()))
 
     def solve(self):
         """Solve the min-cost-flow interdiction problem."""
-        solver = pyomo.opt.SolverFactory(self._solver)
+        self._start = time.perf_counter()
+        key = None
+        if self._cache is not None:
+            key = self._cache.key(self._index, "min-cost-flow", self._attacks,
+                                  self._solver, self._native_primal,
+                                  self._time_limit, self._mip_gap)
+        if key is None or not self._load_cached(key):
+            if self._solver == "greedy":
+                self._solve_greedy()
+            elif self._solver == "scipy":
+                self._solve_matrix()
+            else:
+                self._solve_model()
+            if key is not None:
+                self._cache.save(key, self._primal, self._idual)
+        self.solve_time = time.perf_counter() - self._start
+        return self._primal, self._idual
+
+    def _solve_model(self):
+        # Solve the interdiction problem with Pyomo.
+        if self._idual_solver is None:
+            self._idual_solver = ModelSolver(
+                self._idual, self._solver, self._tee)
+            if not self._native_primal:
+                self._primal_solver = ModelSolver(
+                    self._primal, self._solver, self._tee)
 
         # Solve the dual first:
-        self._idual.BlockLimit.construct()
-        self._idual.BlockLimit._constructed = False  # pylint: disable=protected-access
-        del self._idual.BlockLimit._data[None]  # pylint: disable=protected-access
-        self._idual.BlockLimit.reconstruct()
-        self._idual.preprocess()
-        results = solver.solve(self._idual, tee=self._tee)
+        self._idual.attacks = self._attacks
+        cutoff = self._cutoff()
+        results = self._idual_solver.solve([self._idual.BlockLimit],
+                                           warmstart=cutoff is not None,
+                                           cutoff=cutoff,
+                                           time_limit=self._remaining_time(),
+                                           mip_gap=self._mip_gap)
 
         # Check that we actually computed an optimal solution:
         if results.solver.status != pyomo.opt.SolverStatus.ok:
@@ -201,18 +449,17 @@ class MinCostFlowInterdiction:
 
         # Now put interdictions into xbar and solve primal:
         self._idual.solutions.load_from(results)
+        self._incumbent = (self._attacks, pe.value(self._idual.OBJ))
 
-        for e in self._topology.link_data.index:
-            self._topology.link_data.loc[e, "xbar"] = \
-                self._idual.x[e].value
+        xbar = var_values(self._idual.x)
+        self._report(xbar, pe.value(self._idual.OBJ))
+        self._topology.link_data["xbar"] = xbar[self._index.link_edge]
+        if self._native_primal:
+            self._solve_native_primal(xbar)
+            return
+        self._primal.xbar.store_values(dict(zip(self._index.edges, xbar)))
 
-        self._primal.OBJ.construct()
-        self._primal.OBJ._constructed = False  # pylint: disable=protected-access
-        self._primal.OBJ._init_sense = pe.minimize  # pylint: disable=protected-access
-        del self._primal.OBJ._data[None]  # pylint: disable=protected-access
-        self._primal.OBJ.reconstruct()
-        self._primal.preprocess()
-        results = solver.solve(self._primal, tee=self._tee)
+        results = self._primal_solver.solve([self._primal.OBJ])
 
         # Check that we actually computed an optimal solution:
         if results.solver.status != pyomo.opt.SolverStatus.ok:
@@ -223,39 +470,92 @@ class MinCostFlowInterdiction:
         # Load results:
         self._primal.solutions.load_from(results)
 
-        # Return results:
-        return self._primal, self._idual
-
-    def print(self):
-        """Print solution."""
-        edges = sorted(self._topology.link_set)
+    def result(self):
+        """Return solution as an InterdictionResult.
+
+        The values are extracted from the models as arrays, together with
+        the duals of the primal if the solver provided them.
+        """
+        index = self._index
+        kwargs = {}
+        kwargs["unsat_supply"] = var_values(self._primal.UnsatSupply)
+        kwargs["unsat_demand"] = var_values(self._primal.UnsatDemand)
+        if isinstance(self._primal, MatrixModel):
+            if self._primal.duals is not None:
+                kwargs["node_dual"] = self._primal.duals["FlowBalance"]
+        else:
+            kwargs["node_dual"] = constraint_duals(
+                self._primal, self._primal.FlowBalance, index.nodes)
+            kwargs["link_dual"] = constraint_duals(
+                self._primal, self._primal.Capacity, index.edges)
+        return InterdictionResult(
+            self._attacks, index.edges, index.nodes,
+            var_values(self._idual.x), var_values(self._primal.y),
+            primal=self._primal.OBJ(), dual=self._idual.OBJ(),
+            time=self.solve_time, **kwargs)
+
+    def criticality(self):
+        """Return attackable links ranked by criticality.
+
+        The primal is solved without interdiction, and then with each
+        attackable link carrying flow cut in turn; the links are ranked by
+        the loss of the objective, and the reduced cost of the bound on
+        the cut flow is given as the price (see link_criticality()). This
+        is a screen with linear programs only before solving the
+        interdiction problem. The primal is solved in matrix form with
+        HiGHS through SciPy for any solver.
+        """
+        primal = self._create_matrix_primal()
+        primal.set_cost("y", self._risk)
+        if not primal.solve():
+            logging.warning("Check solver optimality")
+        return link_criticality(self._index, primal)
+
+    def solution(self):
+        """Return solution as a record.
+
+        The record is a dict with the number of attacks, the interdicted
+        links, the flow on each link, the unsatisfied supply and demand on
+        each node, the primal and dual objectives and the solve time.
+        """
+        result = self.result()
+        record = {"attacks": self._attacks}
+        record["interdicted"] = result.interdicted()
+        record["flows"] = list(zip(result.edges, result.flow.tolist()))
+        record["unsat_supply"] = sorted(
+            zip(result.nodes, result.unsat_supply.tolist()))
+        record["unsat_demand"] = sorted(
+            zip(result.nodes, result.unsat_demand.tolist()))
+        record["primal"] = result.primal
+        record["dual"] = result.dual
+        record["time"] = result.time
+        return record
+
+    @staticmethod
+    def print_solution(record):
+        """Print solution record."""
         print("%s" % ("-" * 70))
-        print("Number of attacks: %d" % self._attacks)
+        print("Number of attacks: %d" % record["attacks"])
         print("%s" % ("-" * 70))
-        it = 0
-        for e in edges:
-            if self._idual.x[e].value > 0:
-                it += 1
-                eij = "(" + str(e[0]) + ", " + str(e[1]) + ")"
-                print("Interdicted link %d: %s" % (it, eij))
-        nodes = sorted(self._topology.node_data.index)
-        for n in nodes:
-            remain_supply = self._primal.UnsatSupply[n].value
+        for it, e in enumerate(record["interdicted"]):
+            eij = "(" + str(e[0]) + ", " + str(e[1]) + ")"
+            print("Interdicted link %d: %s" % (it + 1, eij))
+        for n, remain_supply in record["unsat_supply"]:
             if remain_supply > 0:
                 print("Remaining supply on node %s: %.2f" %
                       (str(n), remain_supply))
-        for n in nodes:
-            remain_demand = self._primal.UnsatDemand[n].value
+        for n, remain_demand in record["unsat_demand"]:
             if remain_demand > 0:
                 print("Remaining demand on node %s: %.2f" %
                       (str(n), remain_demand))
         print("%s" % ("-" * 70))
         print("Link\t\tFlow")
         print("%-12s" % ("-" * 70))
-        for ei, ej in self._topology.link_set:
-            flow = self._primal.y[(ei, ej)].value
+        for (ei, ej), flow in record["flows"]:
             eij = "(" + str(ei) + ", " + str(ej) + ")"
             print("%-12s\t%.2f" % (eij, flow))
         print("%s" % ("-" * 70))
         print("Total cost: %.2f (primal), %.2f (dual)" %
-              (self._primal.OBJ(), self._idual.OBJ()))
+              (record["primal"], record["dual"]))
+        if record.get("time") is not None:
+            print("Solve time: %.2f s" % record["time"])
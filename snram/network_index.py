@@ -0,0 +1,87 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides a positional index of the nodes and links of a topology."""
+
+import numpy as np
+
+
+class NetworkIndex:
+    """Class for indexing network topologies by position.
+
+    Nodes and links are numbered by their rows in node_data and link_data.
+    Link attributes (capacity, risk, attackable) and node attributes
+    (supply_demand) are stored as lists of plain numbers, with the default
+    values -1, 0, 0 and 0 for missing columns. Incoming and outgoing links
+    of each node are stored in CSR format ordered by link position.
+    Repeated links are merged into edges (the unique links), which take
+    the attributes of the last of their links.
+    """
+
+    def __init__(self, topology):
+        node_data = topology.node_data
+        link_data = topology.link_data
+        self.nodes = node_data.index.tolist()
+        self.links = link_data.index.tolist()
+        self.node_pos = {n: k for k, n in enumerate(self.nodes)}
+        self.link_pos = {e: k for k, e in enumerate(self.links)}
+        self.edges = list(self.link_pos)
+        edge_pos = {e: k for k, e in enumerate(self.edges)}
+        self.link_edge = np.array([edge_pos[e] for e in self.links],
+                                  dtype=np.int64)
+        self.edge_link = np.array(list(self.link_pos.values()),
+                                  dtype=np.int64)
+
+        index = link_data.index
+        self.start = node_data.index.get_indexer(
+            index.get_level_values(0))
+        self.end = node_data.index.get_indexer(index.get_level_values(1))
+        if (self.start < 0).any() or (self.end < 0).any():
+            raise ValueError("links with unknown nodes")
+
+        self.capacity = self._column(link_data, "capacity", -1)
+        self.risk = self._column(link_data, "risk", 0)
+        self.attackable = self._column(link_data, "attackable", 0)
+        self.supply_demand = self._column(node_data, "supply_demand", 0)
+
+        self._out_ptr, self._out_links = self._adjacency(self.start)
+        self._in_ptr, self._in_links = self._adjacency(self.end)
+
+    @staticmethod
+    def _column(data, column, default):
+        # Return column as list, or default values if missing.
+        if column in data:
+            return data[column].tolist()
+        return [default] * len(data)
+
+    def _adjacency(self, nodes):
+        # Group link positions by node in CSR format.
+        order = np.argsort(nodes, kind="stable")
+        ptr = np.zeros(len(self.nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(nodes, minlength=len(self.nodes)), out=ptr[1:])
+        return ptr.tolist(), order.tolist()
+
+    def incidence(self):
+        """Return coordinates and values of the node-edge incidence matrix.
+
+        Entries are +1 for links entering and -1 for links leaving a node,
+        summed over repeated links.
+        """
+        rows = np.concatenate([self.end, self.start])
+        cols = np.concatenate([self.link_edge, self.link_edge])
+        vals = np.concatenate([np.ones(len(self.links)),
+                               -np.ones(len(self.links))])
+        return (rows, cols, vals)
+
+    def links_from(self, n):
+        """Return positions of links leaving node n."""
+        pos = self.node_pos[n]
+        return self._out_links[self._out_ptr[pos]:self._out_ptr[pos + 1]]
+
+    def links_to(self, n):
+        """Return positions of links entering node n."""
+        pos = self.node_pos[n]
+        return self._in_links[self._in_ptr[pos]:self._in_ptr[pos + 1]]
@@ -5,16 +5,37 @@
 
 """Provides a network risk model."""
 
+import numpy as np
 from snram.topology import NetworkTopology
-from snram.risk_score import THREAT_MIN, THREAT_MAX
+from snram.risk_score import THREAT_MAX
 from snram.risk_score import VULN_MIN
 from snram.risk_score import CONS_MIN
 
+# Storage types for the risk vectors. Scores are in the range 1-5 and
+# risk = T x V x C is at most 125.
+SCORE_DTYPE = np.int8
+RISK_DTYPE = np.int16
+
 
 class NetworkRisk:
-    """Class for handling network risks."""
+    """Class for handling network risks.
+
+    Threat, vulnerability, consequence and risk are kept as contiguous
+    NumPy arrays for nodes and links. The node_data and link_data frames of
+    the topology are only updated when sync() is called, which is done by
+    the reporting methods.
+
+    Link threats are computed from the link betweenness centrality. For
+    large topologies, samples gives the number of randomly chosen source
+    nodes used to estimate it, with seed for the random generator, and
+    workers the number of processes used to compute it.
+
+    The attackable flags are read from the topology, and the link vectors
+    are reloaded from link_data after links are added or removed (threats
+    of the other links are kept).
+    """
 
-    def __init__(self, topology):
+    def __init__(self, topology, samples=None, seed=None, workers=None):
         self.topology = None
         if isinstance(topology, NetworkTopology):
             self.topology = topology
@@ -23,125 +44,169 @@ class NetworkRisk:
         else:
             raise AttributeError("unknown topology provided")
 
-        if "threat" not in self.topology.node_data:
-            self.topology.node_data["threat"] = self._compute_node_threat()
-        if "risk" not in self.topology.node_data:
-            self.topology.node_data["risk"] = self._compute_node_risk()
-        if "threat" not in self.topology.link_data:
-            self.topology.link_data["threat"] = self._compute_link_threat()
-        if "risk" not in self.topology.link_data:
-            self.topology.link_data["risk"] = self._compute_link_risk()
+        self.samples = samples
+        self.seed = seed
+        self.workers = workers
+        # Largest std. error of sampled link threats in threat levels:
+        self.link_threat_error = None
+
+        self._vectors = {"threat": {}, "vulnerability": {},
+                         "consequence": {}, "risk": {}}
+        self._stale = set()  # (asset, attribute) pairs not yet synchronised
+        self._reload = set()  # assets with vectors to reload from topology
+        self._load_vectors("nodes")
+        self._load_vectors("links")
+        self.sync()
+        self.topology.add_observer(self)
+
+    def _asset_data(self, asset):
+        # Return data frame for given asset.
+        if asset == "nodes":
+            return self.topology.node_data
+        elif asset == "links":
+            return self.topology.link_data
+        raise KeyError("unknown asset: " + str(asset))
+
+    def _load_vectors(self, asset):
+        # Load risk vectors for given asset from the topology data frame.
+        data = self._asset_data(asset)
+        size = len(data)
+        for attribute, default in (("vulnerability", VULN_MIN),
+                                   ("consequence", CONS_MIN)):
+            if attribute in data:
+                values = np.ascontiguousarray(data[attribute].values,
+                                              dtype=SCORE_DTYPE)
+            else:
+                values = np.full(size, default, dtype=SCORE_DTYPE)
+            self._vectors[attribute][asset] = values
+
+        if "threat" in data:
+            self._vectors["threat"][asset] = np.ascontiguousarray(
+                data["threat"].values, dtype=SCORE_DTYPE)
+        else:
+            if asset == "nodes":
+                threat = self._compute_node_threat()
+            else:
+                threat = self._compute_link_threat()
+            self._vectors["threat"][asset] = threat
+            self._stale.add((asset, "threat"))
+
+        # Risk provided with the topology is kept as is:
+        if "risk" in data:
+            self._vectors["risk"][asset] = np.ascontiguousarray(
+                data["risk"].values)
+        else:
+            self._update_risk(asset)
 
     def _compute_node_threat(self):
         """Compute threat index from the degree centrality of the node."""
         degree = self.topology.node_degree_centrality()
-        return [int(round(di * THREAT_MAX)) for di in degree]
+        return np.rint(np.asarray(degree) * THREAT_MAX).astype(SCORE_DTYPE)
 
     def _compute_link_threat(self):
         """Compute threat index from the edge betweenness centrality."""
-        betweenness = self.topology.link_betweenness_centrality()
-        return [int(round(bi * THREAT_MAX)) for bi in betweenness]
+        betweenness, error = self.topology.link_betweenness_centrality(
+            self.samples, self.seed, return_error=True, workers=self.workers)
+        if self.samples is not None:
+            # Threat levels are the normalised betweenness times THREAT_MAX:
+            self.link_threat_error = float(np.max(error) * THREAT_MAX)
+        return np.rint(np.asarray(betweenness) * THREAT_MAX).astype(SCORE_DTYPE)
 
-    def _compute_node_risk(self):
-        """Compute node risk = threat * vulnerability * consequence."""
-        if "threat" in self.topology.node_data:
-            threat = self.topology.node_data["threat"]
-        else:
-            threat = [THREAT_MIN] * len(self.topology.node_data)
-        if "vulnerability" in self.topology.node_data:
-            vuln = self.topology.node_data["vulnerability"]
-        else:
-            vuln = [VULN_MIN] * len(self.topology.node_data)
-        if "consequence" in self.topology.node_data:
-            cons = self.topology.node_data["consequence"]
-        else:
-            cons = [CONS_MIN] * len(self.topology.node_data)
-        risk = self.compute_risk(threat, vuln, cons)
-        self.topology.node_data["risk"] = risk
-        return risk
+    def _update_risk(self, asset):
+        # Compute risk = threat * vulnerability * consequence for given asset.
+        self._vectors["risk"][asset] = self.compute_risk(
+            self._vectors["threat"][asset],
+            self._vectors["vulnerability"][asset],
+            self._vectors["consequence"][asset])
+        self._stale.add((asset, "risk"))
 
-    def _compute_link_risk(self):
-        """Compute link risk = threat * vulnerability * consequence."""
-        if "threat" in self.topology.link_data:
-            threat = self.topology.link_data["threat"]
-        else:
-            threat = [THREAT_MIN] * len(self.topology.link_data)
-        if "vulnerability" in self.topology.link_data:
-            vuln = self.topology.link_data["vulnerability"]
-        else:
-            vuln = [VULN_MIN] * len(self.topology.link_data)
-        if "consequence" in self.topology.link_data:
-            cons = self.topology.link_data["consequence"]
-        else:
-            cons = [CONS_MIN] * len(self.topology.link_data)
-        risk = self.compute_risk(threat, vuln, cons)
-        self.topology.link_data["risk"] = risk
-        return risk
+    def _check_vectors(self, asset):
+        # Reload risk vectors for given asset if the topology has changed.
+        if asset in self._reload:
+            self._reload.discard(asset)
+            self._load_vectors(asset)
+
+    def _attackable(self, asset):
+        # Return attackable vector for given asset from the topology.
+        data = self._asset_data(asset)
+        if "attackable" in data:
+            return np.asarray(data["attackable"].values, dtype=SCORE_DTYPE)
+        return np.ones(len(data), dtype=SCORE_DTYPE)
+
+    def links_changing(self):
+        """Write modified risk vectors before links are added or removed."""
+        self.sync()
+
+    def links_changed(self):
+        """Reload link vectors after links are added or removed."""
+        self._reload.add("links")
+
+    def _get_vector(self, attribute, asset):
+        # Return a copy of the risk vector for given asset attribute.
+        self._check_vectors(asset)
+        return self._vectors[attribute][asset].copy()
+
+    def _set_vector(self, attribute, asset, values):
+        # Set risk vector for given asset attribute and update risk vector.
+        self._check_vectors(asset)
+        values = np.ascontiguousarray(values, dtype=SCORE_DTYPE)
+        assert len(self._vectors[attribute][asset]) == len(values)
+        self._vectors[attribute][asset] = values
+        self._stale.add((asset, attribute))
+        self._update_risk(asset)
+
+    def sync(self):
+        """Write modified risk vectors to the topology data frames."""
+        for asset, attribute in [(asset, attribute)
+                                 for attribute in self._vectors
+                                 for asset in ("nodes", "links")
+                                 if (asset, attribute) in self._stale]:
+            values = self._vectors[attribute][asset]
+            if values.dtype.kind in "iu":
+                # Keep default integer columns in the data frames so that
+                # downstream arithmetic cannot overflow.
+                values = values.astype(np.int64)
+            self._asset_data(asset)[attribute] = values
+        self._stale.clear()
 
     def get_threat(self, asset):
         """Get threat vector for given asset."""
-        if asset == "nodes":
-            return self.topology.node_data["threat"]
-        elif asset == "links":
-            return self.topology.link_data["threat"]
+        return self._get_vector("threat", asset)
 
     def set_threat(self, asset, threat):
         """Set threat vector for given asset and update risk vector."""
-        if asset == "nodes":
-            assert len(self.topology.node_data["threat"]) == len(threat)
-            self.topology.node_data["threat"] = threat
-            self._compute_node_risk()
-        elif asset == "links":
-            assert len(self.topology.link_data["threat"]) == len(threat)
-            self.topology.link_data["threat"] = threat
-            self._compute_link_risk()
+        self._set_vector("threat", asset, threat)
 
     def get_vulnerability(self, asset):
         """Get vulnerability vector for given asset."""
-        if asset == "nodes":
-            return self.topology.node_data["vulnerability"]
-        elif asset == "links":
-            return self.topology.link_data["vulnerability"]
+        return self._get_vector("vulnerability", asset)
 
     def set_vulnerability(self, asset, vuln):
         """Set vulnerability vector for given asset and update risk vector."""
-        if asset == "nodes":
-            assert len(self.topology.node_data["vulnerability"]) == len(vuln)
-            self.topology.node_data["vulnerability"] = vuln
-            self._compute_node_risk()
-        elif asset == "links":
-            assert len(self.topology.link_data["vulnerability"]) == len(vuln)
-            self.topology.link_data["vulnerability"] = vuln
-            self._compute_link_risk()
+        self._set_vector("vulnerability", asset, vuln)
 
     def get_consequence(self, asset):
         """Get consequence vector for given asset."""
-        if asset == "nodes":
-            return self.topology.node_data["consequence"]
-        elif asset == "links":
-            return self.topology.link_data["consequence"]
+        return self._get_vector("consequence", asset)
 
-    def set_consequence(self, asset, vuln):
+    def set_consequence(self, asset, cons):
         """Set consequence vector for given asset and update risk vector."""
-        if asset == "nodes":
-            assert len(self.topology.node_data["consequence"]) == len(vuln)
-            self.topology.node_data["consequence"] = vuln
-            self._compute_node_risk()
-        elif asset == "links":
-            assert len(self.topology.link_data["consequence"]) == len(vuln)
-            self.topology.link_data["consequence"] = vuln
-            self._compute_link_risk()
+        self._set_vector("consequence", asset, cons)
 
     def get_risk(self, asset):
         """Get risk vector for given asset."""
-        if asset == "nodes":
-            return self.topology.node_data["risk"]
-        elif asset == "links":
-            return self.topology.link_data["risk"]
+        return self._get_vector("risk", asset)
+
+    def get_attackable(self, asset):
+        """Get attackable vector for given asset."""
+        return self._attackable(asset).copy()
 
     def compute_risk(self, threat, vuln, cons):
         """Compute risk from threat, vulnerability and consequence vectors."""
-        return [t * v * c for t, v, c in zip(threat, vuln, cons)]
+        risk = np.asarray(threat, dtype=RISK_DTYPE) \
+            * np.asarray(vuln, dtype=RISK_DTYPE)
+        risk *= np.asarray(cons, dtype=RISK_DTYPE)
+        return risk
 
     def find_critical_asset(self, asset, attribute):
         """Find index and maximum value for the given asset attribute."""
@@ -153,8 +218,85 @@ class NetworkRisk:
         val = val[attribute].values[0]
         return (idx, val)
 
+    def find_critical_index(self, asset, attribute):
+        """Find position and maximum value for the given asset attribute.
+
+        Same selection as find_critical_asset(), but computed on the risk
+        vectors without synchronising the data frames.
+        """
+        self._check_vectors(asset)
+        attackable = self._attackable(asset)
+        values = self._vectors[attribute][asset]
+        risk = self._vectors["risk"][asset]
+        mask = attackable == attackable.max()
+        # Asset with largest risk is most critical:
+        mask &= values == values[mask].max()
+        mask &= risk == risk[mask].max()
+        idx = int(np.flatnonzero(mask)[0])
+        return (idx, values[idx])
+
+    def evaluate_scenarios(self, asset, threat=None, vuln=None, cons=None,
+                           top_k=1):
+        """Evaluate risk for a batch of what-if scenarios.
+
+        The threat, vulnerability and consequence arguments are matrices of
+        shape (scenarios, assets), or vectors that apply to all scenarios.
+        Omitted arguments are taken from the current risk vectors. Neither
+        the risk vectors nor the topology data frames are modified.
+
+        Returns the risk matrix, the risk sum of each scenario and the
+        positions of the top_k critical assets of each scenario, ranked by
+        attackable, risk and lowest position as in find_critical_index().
+        """
+        self._check_vectors(asset)
+        if threat is None:
+            threat = self._vectors["threat"][asset]
+        if vuln is None:
+            vuln = self._vectors["vulnerability"][asset]
+        if cons is None:
+            cons = self._vectors["consequence"][asset]
+        vectors = [np.atleast_2d(values) for values in (threat, vuln, cons)]
+        shape = np.broadcast_shapes(*[values.shape for values in vectors])
+        size = shape[1]
+        assert size == len(self._vectors["risk"][asset])
+
+        # Scenarios are evaluated in blocks to limit temporary memory use:
+        risk = np.empty(shape, dtype=RISK_DTYPE)
+        block = max(1, 2**20 // size)
+        for start in range(0, len(risk), block):
+            risk[start:start + block] = self.compute_risk(
+                *[values[start:start + block] if len(values) > 1 else values
+                  for values in vectors])
+        risk_sum = risk.sum(axis=1)
+
+        # Rank assets by a unique key with ties broken on lowest position:
+        attackable = self._attackable(asset).astype(np.int64)
+        attackable -= attackable.min()
+        scale = int(risk.max()) + 1
+        dtype = np.int64
+        if (int(attackable.max()) + 1) * scale * size < 2**31:
+            dtype = np.int32
+        rank = (attackable * scale).astype(dtype)
+        tie = np.arange(size - 1, -1, -1, dtype=dtype)
+        top_k = min(top_k, size)
+        critical = np.empty((len(risk), top_k), dtype=np.intp)
+        for start in range(0, len(risk), block):
+            key = rank + risk[start:start + block]
+            key *= size
+            key += tie
+            if top_k < size:
+                part = np.argpartition(key, size - top_k, axis=1)
+                part = part[:, size - top_k:]
+            else:
+                part = np.broadcast_to(np.arange(size), key.shape)
+            order = np.argsort(np.take_along_axis(key, part, axis=1), axis=1)
+            critical[start:start + block] = np.take_along_axis(
+                part, order[:, ::-1], axis=1)
+        return (risk, risk_sum, critical)
+
     def risk_assessment(self):
         """Conduct network risk assessment."""
+        self.sync()
         print("Network Risk Assessment:")
         print("%s" % ("-" * 70))
         print("Node\t\tT\tV\tC\tR")
@@ -183,9 +325,14 @@ class NetworkRisk:
         print("V = Vulnerability (1-5)")
         print("C = Consequence (1-5)")
         print("R = Risk (T x V x C)")
+        if self.link_threat_error is not None:
+            print("Link threats estimated from %d sampled nodes "
+                  "(max. std. error: %.2f threat levels)" %
+                  (self.samples, self.link_threat_error))
 
     def critical_assets(self):
         """Identify critical assets."""
+        self.sync()
         print("\nCritical Assets:")
         print("%s" % ("-" * 70))
         print("                                 Index\t\tValue")
@@ -0,0 +1,126 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides an on-disk cache of interdiction solutions."""
+
+import glob
+import hashlib
+import os
+import pickle
+import pyomo.environ as pe
+from snram.matrix_model import MatrixModel
+
+# Version of the solution cache; bump when the cached state changes.
+CACHE_VERSION = 1
+
+
+def solved(model):
+    """Return true if a Pyomo or matrix model has a solution."""
+    if isinstance(model, MatrixModel):
+        return model.solution is not None
+    return pe.value(model.OBJ, exception=False) is not None
+
+
+def solution_state(primal, idual):
+    """Return values of the variables and objectives of the models."""
+    state = []
+    for model in (primal, idual):
+        if isinstance(model, MatrixModel):
+            state.append((model.solution, model.OBJ()))
+            continue
+        state.append({var.name: [v.value for v in var.values()]
+                      for var in model.component_objects(pe.Var)})
+    return state
+
+
+def load_solution_state(primal, idual, state):
+    """Load values of the variables and objectives into the models."""
+    for model, model_state in zip((primal, idual), state):
+        if isinstance(model, MatrixModel):
+            model.set_solution(*model_state)
+            continue
+        for name, values in model_state.items():
+            for var, value in zip(model.component(name).values(), values):
+                var.set_value(value, skip_validation=True)
+
+
+class SolutionCache:
+    """Class for caching solutions of interdiction models on disk.
+
+    Solutions are stored in cache_dir as one pickle file per solve, named
+    by a SHA-256 hash of the network data used by the models, the
+    interdiction method, the number of attacks and the solver options.
+    The values of the variables and objectives of the primal and dual
+    models are cached, so that cached solves return the same models as
+    solved ones. When the files take more than max_size bytes, the least
+    recently used are removed.
+    """
+
+    def __init__(self, cache_dir, max_size=1 << 30):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+        self._evict()
+
+    @staticmethod
+    def key(index, *args):
+        """Return key of a solve of the network index with given options."""
+        data = (CACHE_VERSION, index.nodes, index.links, index.capacity,
+                index.risk, index.attackable, index.supply_demand, args)
+        return hashlib.sha256(repr(data).encode()).hexdigest()
+
+    def _cache_file(self, key):
+        # Return name of cache file for the given key.
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def load(self, key, primal, idual):
+        """Load cached solution into the models; return true on a hit."""
+        cache_file = self._cache_file(key)
+        try:
+            with open(cache_file, "rb") as f:
+                state = pickle.load(f)
+            os.utime(cache_file)  # mark as recently used
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        load_solution_state(primal, idual, state)
+        return True
+
+    def save(self, key, primal, idual):
+        """Save solution of the models, unless they are not solved."""
+        if not solved(primal) or not solved(idual):
+            return
+        state = solution_state(primal, idual)
+
+        cache_file = self._cache_file(key)
+        tmp_file = "%s.%d.tmp" % (cache_file, os.getpid())
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        self._evict()
+
+    def _evict(self):
+        # Remove least recently used cache files until within max_size.
+        files = []
+        for cache_file in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+            try:
+                stat = os.stat(cache_file)
+            except OSError:  # removed by another process
+                continue
+            files.append((stat.st_mtime, stat.st_size, cache_file))
+        size = sum(f[1] for f in files)
+        for _, file_size, cache_file in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
+            size -= file_size
+
+    def clear(self):
+        """Remove all cached solutions."""
+        for cache_file in glob.glob(os.path.join(self.cache_dir, "*.pkl")):
+            os.remove(cache_file)
@@ -0,0 +1,121 @@
+# Copyright (c) 2020 Stig Rune Sellevag
+#
+# This file is distributed under the MIT License. See the accompanying file
+# LICENSE.txt or http://www.opensource.org/licenses/mit-license.php for terms
+# and conditions.
+
+"""Provides a solver wrapper for re-solving Pyomo models."""
+
+import math
+import pyomo
+import pyomo.opt
+import pyomo.environ as pe
+from pyomo.solvers.plugins.solvers.persistent_solver import PersistentSolver
+
+# Options for objective cutoffs of solvers when minimising and maximising:
+CUTOFF_OPTIONS = {"cplex": ("mip_tolerances_uppercutoff",
+                            "mip_tolerances_lowercutoff"),
+                  "gurobi": ("Cutoff", "Cutoff"),
+                  "highs": ("objective_bound", "objective_bound")}
+
+# Options for time limits (seconds) and relative MIP gaps of solvers:
+LIMIT_OPTIONS = {"cplex": ("timelimit", "mip_tolerances_mipgap"),
+                 "glpk": ("tmlim", "mipgap"),
+                 "gurobi": ("TimeLimit", "MIPGap"),
+                 "highs": ("time_limit", "mip_rel_gap")}
+
+
+class ModelSolver:
+    """Class for solving a Pyomo model repeatedly.
+
+    The solver instance is kept between solves. Persistent solver
+    interfaces (e.g. cplex_persistent, gurobi_persistent) are given the
+    model once, and only components depending on mutable parameters are
+    pushed to the solver when these change. APPSI interfaces (e.g.
+    appsi_highs) detect changed parameters themselves.
+
+    Solves can be warm started from the current values of the variables
+    if the solver supports it, and given an objective cutoff for CPLEX,
+    Gurobi and HiGHS, and a time limit and MIP gap for these and GLPK.
+    """
+
+    def __init__(self, model, solver="cplex", tee=False):
+        self.model = model
+        self.solver = pyomo.opt.SolverFactory(solver)
+        self.tee = tee
+        self.persistent = isinstance(self.solver, PersistentSolver)
+        self.sense = next(model.component_data_objects(
+            pe.Objective, active=True)).sense
+        self._cutoff_option = self._find_cutoff_option(solver)
+        self._limit_options = LIMIT_OPTIONS.get(
+            solver.replace("appsi_", "").split("_")[0], (None, None))
+        if self.persistent:
+            self.solver.set_instance(model)
+
+    def _find_cutoff_option(self, solver):
+        # Return name of the cutoff option of the solver, if any.
+        name = solver.replace("appsi_", "").split("_")[0]
+        if name not in CUTOFF_OPTIONS:
+            return None
+        return CUTOFF_OPTIONS[name][self.sense == pe.maximize]
+
+    def _set_cutoff(self, cutoff):
+        # Set objective cutoff, relaxed to keep solutions of equal value.
+        if self._cutoff_option is None:
+            return
+        if cutoff is None:
+            if self._cutoff_option == "objective_bound":
+                # APPSI HiGHS keeps options between solves; reset to default:
+                self.solver.options[self._cutoff_option] = math.inf
+            else:
+                self.solver.options.pop(self._cutoff_option, None)
+            return
+        tol = 1.0e-6 * max(1.0, abs(cutoff))
+        if self.sense == pe.minimize:
+            cutoff += tol
+        else:
+            cutoff -= tol
+            if self._cutoff_option == "objective_bound":
+                # HiGHS solves maximisation problems as minimisation of the
+                # negated objective, and objective_bound is an upper bound
+                # on that, so a lower cutoff c becomes the bound -c.
+                cutoff = -cutoff
+        self.solver.options[self._cutoff_option] = cutoff
+
+    def _set_limits(self, time_limit, mip_gap):
+        # Set time limit and MIP gap, or remove them if None.
+        for option, value in zip(self._limit_options, (time_limit, mip_gap)):
+            if option is None:
+                continue
+            if value is None:
+                self.solver.options.pop(option, None)
+            elif option == "tmlim":
+                self.solver.options[option] = max(math.ceil(value), 1)
+            else:
+                self.solver.options[option] = value
+
+    def solve(self, updated=(), warmstart=False, cutoff=None,
+              time_limit=None, mip_gap=None):
+        """Solve model after the given components have been updated.
+
+        With warmstart=True, the current values of the variables are given
+        as a starting point to solvers that accept one. A cutoff excludes
+        solutions with worse objective values. With a time limit (in
+        seconds) or relative MIP gap, the solver returns the best solution
+        found when reaching either.
+        """
+        self._set_cutoff(cutoff)
+        self._set_limits(time_limit, mip_gap)
+        kwargs = {}
+        if warmstart and self.solver.warm_start_capable():
+            kwargs["warmstart"] = True
+        if not self.persistent:
+            return self.solver.solve(self.model, tee=self.tee, **kwargs)
+        for component in updated:
+            if component.ctype is pe.Objective:
+                self.solver.set_objective(component)
+            else:
+                self.solver.remove_constraint(component)
+                self.solver.add_constraint(component)
+        suffixes = ["dual"] if hasattr(self.model, "dual") else []
+        return self.solver.solve(tee=self.tee, suffixes=suffixes, **kwargs)
@@ -6,49 +6,334 @@
 
 """Provides a network topology model."""
 
+import glob
+import hashlib
+import os
+import pickle
+import weakref
+from collections import Counter
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import matplotlib.pyplot as plt
 from networkx import nx
+from snram.graph import CSRGraph, BiconnectedComponents
+
+# Version of the binary topology cache; bump when the cached state changes.
+CACHE_VERSION = 2
+
+# Column types used when streaming topologies from CSV/TSV files:
+CSV_DTYPES = {"vulnerability": np.int8,
+              "consequence": np.int8,
+              "threat": np.int8,
+              "attackable": np.int8,
+              "risk": np.int16,
+              "capacity": np.float64,
+              "supply_demand": np.float64}
+
+
+def _file_hash(filename):
+    # Return SHA-256 hash of the file content.
+    sha = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _csv_sep(filename, sep=None):
+    # Return field separator for CSV/TSV file.
+    if sep is None:
+        sep = "\t" if filename.endswith(".tsv") else ","
+    return sep
+
+
+def _node_labels(labels):
+    # Return node labels read as strings as numbers if they are all numeric,
+    # which gives the same labels as read_excel.
+    numeric = pd.to_numeric(labels, errors="coerce")
+    if len(labels) == 0 or pd.isna(numeric).any():
+        return labels
+    return pd.Index(numeric)
 
 
 class NetworkTopology:
-    """Class for representing network topologies."""
+    """Class for representing network topologies.
 
-    def __init__(self, xlsx_file):
+    Links are added and removed with add_link() and remove_link(), which
+    queue the changes and apply them to link_data, link_set and csr in one
+    pass when these are next used. Observers registered with
+    add_observer() are notified before and after each change of the links.
+    Nodes are made attackable or not with set_attackable(); changes made
+    directly to node_data["attackable"] are picked up by the next query of
+    the articulation points.
+    """
+
+    def __init__(self, xlsx_file=None, cache_dir=None):
         self.node_data = None
-        self.link_data = None
+        self._link_data = None
         self.node_set = None
-        self.link_set = None
-        self.graph = None
+        self._link_set = None
+        self._csr = None
+        self._link_adds = []  # queued (sequence, link, data) additions
+        self._link_drops = set()  # queued removals of links in _link_data
+        self._link_removed = {}  # sequence of last removal of each link
+        self._link_pending = Counter()  # queued additions not removed
+        self._link_seq = 0
+        self._graph = None
+        self._biconnected = None
+        self._adjacency = None  # link counts between neighbouring nodes
+        self._attackable = None  # attackable flags of _biconnected
+        self._observers = weakref.WeakSet()
 
         # Load network topology from Excel file:
-        self.load(xlsx_file)
+        if xlsx_file:
+            self.load(xlsx_file, cache_dir)
+
+    def __getstate__(self):
+        # Observers are not pickled.
+        state = self.__dict__.copy()
+        del state["_observers"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._observers = weakref.WeakSet()
+
+    @property
+    def link_data(self):
+        """Link data frame, with queued link changes applied."""
+        self._apply_link_changes()
+        return self._link_data
+
+    @link_data.setter
+    def link_data(self, link_data):
+        self._link_data = link_data
+        self._link_set = None
+        self._csr = None
+        self._link_adds = []
+        self._link_drops = set()
+        self._link_removed = {}
+        self._link_pending = Counter()
+        self._reset()
+
+    @property
+    def link_set(self):
+        """Unique links, with queued link changes applied."""
+        self._apply_link_changes()
+        if self._link_set is None and self._link_data is not None:
+            self._link_set = self._link_data.index.unique()
+        return self._link_set
+
+    @link_set.setter
+    def link_set(self, link_set):
+        self._link_set = link_set
+
+    @property
+    def csr(self):
+        """CSR graph of the topology, with queued link changes applied."""
+        self._apply_link_changes()
+        if self._csr is None and self._link_data is not None:
+            self._csr = self._create_csr()
+        return self._csr
+
+    @csr.setter
+    def csr(self, csr):
+        self._csr = csr
+
+    def _reset(self):
+        # Discard structures derived from the links and nodes.
+        self._graph = None
+        self._biconnected = None
+        self._adjacency = None
+        self._attackable = None
+
+    def _apply_link_changes(self):
+        # Apply queued link removals and additions in one pass.
+        if not self._link_adds and not self._link_drops:
+            return
+        link_data = self._link_data
+        if self._link_drops:
+            link_data = link_data.drop(list(self._link_drops))
+        rows = [(link, data) for seq, link, data in self._link_adds
+                if seq > self._link_removed.get(link, -1)]
+        if rows:
+            row = pd.DataFrame([data for _, data in rows],
+                               columns=link_data.columns,
+                               index=pd.MultiIndex.from_tuples(
+                                   [link for link, _ in rows],
+                                   names=link_data.index.names))
+            row = row.astype(link_data.dtypes.to_dict())
+            link_data = pd.concat([link_data, row])
+        self._link_data = link_data
+        self._link_set = None
+        self._csr = None
+        self._graph = None
+        self._link_adds = []
+        self._link_drops = set()
+        self._link_removed = {}
+        self._link_pending = Counter()
+
+    def _count_links(self, link):
+        # Return number of rows of the link, with queued changes applied.
+        count = self._link_pending[link]
+        index = self._link_data.index
+        if link not in self._link_drops and link in index:
+            loc = index.get_loc(link)
+            if isinstance(loc, slice):
+                count += loc.stop - loc.start
+            elif isinstance(loc, np.ndarray):
+                count += np.count_nonzero(loc)
+            else:
+                count += 1
+        return count
+
+    def add_observer(self, observer):
+        """Register observer of link changes.
+
+        The methods links_changing() and links_changed() of the observer
+        are called before and after each link is added or removed. Only a
+        weak reference to the observer is kept.
+        """
+        self._observers.add(observer)
 
     def _create_graph(self):
-        # Create graph from list of attackable nodes.
+        # Create NetworkX graph from the links.
         graph = nx.Graph()
-        for link, data in self.link_data.iterrows():
-            if "capacity" in data.keys():
-                graph.add_edge(link[0], link[1], capacity=data["capacity"])
-            else:
-                graph.add_edge(link[0], link[1])
+        start_node = self.link_data.index.get_level_values(0)
+        end_node = self.link_data.index.get_level_values(1)
+        if "capacity" in self.link_data:
+            capacity = self.link_data["capacity"].tolist()
+            graph.add_edges_from(zip(start_node, end_node,
+                                     ({"capacity": c} for c in capacity)))
+        else:
+            graph.add_edges_from(zip(start_node, end_node))
         return graph
 
+    def _create_csr(self):
+        # Create CSR graph with node positions given by node_data.
+        index = self.link_data.index
+        nodes = [self.node_data.index.get_indexer(index.levels[k])[index.codes[k]]
+                 for k in range(2)]
+        if (nodes[0] < 0).any() or (nodes[1] < 0).any():
+            raise ValueError("links with unknown nodes")
+        return CSRGraph(len(self.node_data), nodes[0], nodes[1])
+
     def _create_subgraph(self):
         # Create subgraph from list of attackable nodes.
-        nodes = []
-        for node, data in self.node_data.iterrows():
-            if data["attackable"] == 1:
-                nodes.append(node)
+        nodes = self.node_data.index[self.node_data["attackable"] == 1]
         return self.graph.subgraph(nodes)
 
+    def _create_attackable_csr(self):
+        # Create CSR subgraph of attackable nodes.
+        return self.csr.subgraph(self.node_data["attackable"].values == 1)
+
+    def _create_biconnected(self):
+        # Create biconnected components of the subgraph of attackable nodes,
+        # with the link counts between neighbouring nodes and the attackable
+        # flags they are kept up to date for.
+        graph = self._create_attackable_csr()
+        labels = self.node_data.index
+        self._attackable = self.node_data["attackable"].values == 1
+        nodes = labels[self._attackable]
+        edges = graph.edge_nodes[:, graph.edges]
+        self._adjacency = {node: Counter() for node in labels}
+        index = self.link_data.index
+        for u, v in zip(index.get_level_values(0), index.get_level_values(1)):
+            if u != v:
+                self._adjacency[u][v] += 1
+                self._adjacency[v][u] += 1
+        return BiconnectedComponents(nodes, zip(labels[edges[0]],
+                                                labels[edges[1]]))
+
+    def _update_attackable(self, node, attackable):
+        # Update biconnected components for the attackable flag of node.
+        labels = self.node_data.index
+        pos = labels.get_loc(node)
+        if self._attackable[pos] == attackable:
+            return
+        self._attackable[pos] = attackable
+        if attackable:
+            self._biconnected.add_node(node)
+            for w in self._adjacency[node]:
+                if self._attackable[labels.get_loc(w)]:
+                    self._biconnected.add_edge(node, w)
+        else:
+            self._biconnected.remove_node(node)
+
+    def _sync_attackable(self):
+        # Apply attackable flags written directly to node_data.
+        attackable = self.node_data["attackable"].values == 1
+        for pos in np.flatnonzero(attackable != self._attackable):
+            self._update_attackable(self.node_data.index[pos],
+                                    attackable[pos])
+
+    @property
+    def graph(self):
+        """NetworkX graph of the topology, created on first use."""
+        if self._graph is None and self.link_data is not None:
+            self._graph = self._create_graph()
+        return self._graph
+
     def get_graph_with_attackable_nodes(self):
         """Return graph object with attackable nodes."""
         return self._create_subgraph()
 
-    def load(self, xlsx_file):
-        """Load network topology from Excel file."""
+    def _cache_file(self, xlsx_file, cache_dir):
+        # Return name of cache file for the given Excel file. The name is
+        # keyed on the directory of the Excel file, so that files with the
+        # same name in different directories have separate cache files.
+        basename = os.path.splitext(os.path.basename(xlsx_file))[0]
+        source_dir = os.path.dirname(os.path.abspath(xlsx_file))
+        dir_hash = hashlib.sha256(source_dir.encode()).hexdigest()[:16]
+        return os.path.join(cache_dir, "%s-%s-%s-v%d.pkl" %
+                            (basename, dir_hash, _file_hash(xlsx_file),
+                             CACHE_VERSION))
+
+    def _load_cache(self, cache_file):
+        # Load network topology from cache file; return False on failure.
+        try:
+            with open(cache_file, "rb") as f:
+                state = pickle.load(f)
+            node_data, link_data, node_set, link_set, csr = state
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError,
+                ImportError, TypeError, ValueError):
+            return False
+        (self.node_data, self.link_data, self.node_set, self.link_set,
+         self.csr) = (node_data, link_data, node_set, link_set, csr)
+        return True
+
+    def _save_cache(self, cache_file):
+        # Save network topology to cache file and remove stale cache files
+        # for the same Excel file.
+        basename = os.path.basename(cache_file).rsplit("-", 2)[0]
+        cache_dir = os.path.dirname(cache_file)
+        for stale in glob.glob(os.path.join(cache_dir,
+                                            glob.escape(basename) + "-*.pkl")):
+            if stale != cache_file and \
+                    os.path.basename(stale).rsplit("-", 2)[0] == basename:
+                os.remove(stale)
+        state = (self.node_data, self.link_data, self.node_set, self.link_set,
+                 self.csr)
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+
+    def load(self, xlsx_file, cache_dir=None):
+        """Load network topology from Excel file.
+
+        If cache_dir is given, the parsed topology is stored there in a
+        binary cache file keyed on the directory and content hash of the
+        Excel file. Repeated loads of an unchanged file read the cache instead.
+        """
+        cache_file = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_file = self._cache_file(xlsx_file, cache_dir)
+            if os.path.isfile(cache_file) and self._load_cache(cache_file):
+                return
+
         self.node_data = pd.read_excel(xlsx_file, sheet_name="nodes")
         self.link_data = pd.read_excel(xlsx_file, sheet_name="links")
         self.link_data["xbar"] = 0  # needed for network interdiction
@@ -56,7 +341,84 @@ class NetworkTopology:
         self.link_data.set_index(["start_node", "end_node"], inplace=True)
         self.node_set = self.node_data.index.unique()
         self.link_set = self.link_data.index.unique()
-        self.graph = self._create_graph()
+        self.csr = self._create_csr()
+        self._reset()
+
+        if cache_file:
+            self._save_cache(cache_file)
+
+    def load_csv(self, links_file, nodes_file=None, sep=None,
+                 chunksize=1000000):
+        """Load network topology from CSV/TSV link and node tables.
+
+        The tables are streamed in chunks with the column types given by
+        CSV_DTYPES. Node names are read as categoricals, so the link table
+        is stored as category codes and never as an object-dtype frame.
+        Without a node table, the nodes are taken from the link table and
+        are all attackable. Tab separation is used for .tsv files unless
+        sep is given.
+
+        Node names are converted to numbers if all of them are numeric, so
+        that the nodes, links and OD pairs are labelled as when loaded from
+        an Excel file. Names that are equal as numbers (such as 1 and 01)
+        are duplicates.
+        """
+        if nodes_file:
+            chunks = []
+            names = []
+            for chunk in pd.read_csv(nodes_file, sep=_csv_sep(nodes_file, sep),
+                                     chunksize=chunksize,
+                                     dtype=dict(CSV_DTYPES, node="category")):
+                names.append(chunk.pop("node"))
+                chunks.append(chunk)
+            names = union_categoricals(names)
+            nodes = names.categories[names.codes]
+            if len(names.categories) != len(names) or \
+                    not _node_labels(nodes).is_unique:
+                raise ValueError("duplicate nodes in " + nodes_file)
+            self.node_data = pd.concat(chunks, ignore_index=True)
+        else:
+            nodes = None
+
+        # Links are coded against the node table if given, otherwise the
+        # categories of all chunks are merged:
+        node_dtype = "category"
+        if nodes is not None:
+            node_dtype = pd.CategoricalDtype(nodes)
+        chunks = []
+        start_node = []
+        end_node = []
+        for chunk in pd.read_csv(links_file, sep=_csv_sep(links_file, sep),
+                                 chunksize=chunksize,
+                                 dtype=dict(CSV_DTYPES, start_node=node_dtype,
+                                            end_node=node_dtype)):
+            start_node.append(chunk.pop("start_node"))
+            end_node.append(chunk.pop("end_node"))
+            chunks.append(chunk)
+        if nodes is None:
+            nodes = union_categoricals(start_node + end_node).categories
+            self.node_data = pd.DataFrame(
+                {"attackable": np.ones(len(nodes), dtype=np.int8)})
+        start_codes = np.concatenate(
+            [col.cat.set_categories(nodes).cat.codes for col in start_node])
+        end_codes = np.concatenate(
+            [col.cat.set_categories(nodes).cat.codes for col in end_node])
+        if (start_codes < 0).any() or (end_codes < 0).any():
+            raise ValueError("links with unknown nodes in " + links_file)
+        nodes = _node_labels(nodes)
+        if not nodes.is_unique:
+            raise ValueError("duplicate nodes in " + links_file)
+
+        self.node_data.index = pd.Index(nodes, name="node")
+        self.link_data = pd.concat(chunks, ignore_index=True)
+        self.link_data["xbar"] = np.zeros(len(self.link_data), dtype=np.int8)
+        self.link_data.index = pd.MultiIndex(
+            levels=[nodes, nodes], codes=[start_codes, end_codes],
+            names=["start_node", "end_node"])
+        self.node_set = self.node_data.index.unique()
+        self.link_set = self.link_data.index.unique()
+        self.csr = self._create_csr()
+        self._reset()
 
     def to_excel(self, xlsx_file):
         """Write network topology to Excel file."""
@@ -75,20 +437,168 @@ class NetworkTopology:
             plt.savefig(filename, dpi=dpi)
 
     def node_degree_centrality(self):
-        """Compute normalised degree centrality for the nodes."""
-        graph = self.get_graph_with_attackable_nodes()
-        degree = list(nx.degree_centrality(graph).values())
+        """Compute normalised degree centrality for the nodes.
+
+        Values are given in the order of node_data and are zero for nodes
+        outside the attackable subgraph.
+        """
+        graph = self._create_attackable_csr()
+        # Number of nodes in the attackable subgraph:
+        size = np.count_nonzero((self.csr.degree() > 0)
+                                & (self.node_data["attackable"].values == 1))
+        degree = graph.degree() * (1.0 / (size - 1.0))
         degree /= np.max(degree)
         return degree
 
-    def link_betweenness_centrality(self):
-        """Compute normalised link betweenness centrality."""
-        graph = self.get_graph_with_attackable_nodes()
-        betweenness = list(nx.edge_betweenness_centrality(graph).values())
+    def _betweenness(self, samples=None, seed=None, workers=None):
+        # Compute node and edge betweenness of the attackable subgraph,
+        # with the standard error of the edge betweenness. The values are
+        # estimated from sampled source nodes if samples is given.
+        graph = self._create_attackable_csr()
+        sources = np.flatnonzero(graph.degree() > 0)
+        num_sources = len(sources)
+        if samples is None or samples >= num_sources:
+            node_bc, edge_bc = graph.betweenness(sources, workers=workers)
+            return (node_bc, edge_bc, np.zeros(len(edge_bc)))
+
+        rng = np.random.default_rng(seed)
+        sources = np.sort(rng.choice(sources, samples, replace=False))
+        node_bc, edge_bc, squares = graph.betweenness(
+            sources, squares=True, scaled=True, workers=workers)
+        # Standard error of the estimate n/k * sum for sampling without
+        # replacement of k out of n sources:
+        variance = (squares - np.square(edge_bc) / samples) \
+            / max(samples - 1, 1)
+        error = num_sources * np.sqrt(
+            np.maximum(variance, 0.0) * (1.0 - samples / num_sources)
+            / samples)
+        node_bc *= num_sources / samples
+        edge_bc *= num_sources / samples
+        return (node_bc, edge_bc, error)
+
+    def node_betweenness_centrality(self, samples=None, seed=None,
+                                    workers=None):
+        """Compute normalised node betweenness centrality.
+
+        Values are given in the order of node_data and are zero for nodes
+        outside the attackable subgraph. See link_betweenness_centrality()
+        for the arguments.
+        """
+        size = np.count_nonzero((self.csr.degree() > 0)
+                                & (self.node_data["attackable"].values == 1))
+        betweenness, _, _ = self._betweenness(samples, seed, workers)
+        if size > 2:
+            betweenness *= 1 / ((size - 1) * (size - 2))
         betweenness /= np.max(betweenness)
+        return np.round(betweenness, 12)
+
+    def link_betweenness_centrality(self, samples=None, seed=None,
+                                    return_error=False, workers=None):
+        """Compute normalised link betweenness centrality.
+
+        Values are given in the order of link_data and are zero for links
+        outside the attackable subgraph. If samples is given, betweenness
+        is estimated from that number of randomly chosen source nodes
+        (k-pivot sampling with linear scaling) using the given seed. With
+        return_error, the standard error of the normalised values is
+        returned as well (zero for exact computations). It includes the
+        error of the estimated maximum used for normalisation, propagated
+        to first order, but is still too small when very few sources are
+        sampled. The computation is distributed over the given number of
+        worker processes.
+        """
+        size = np.count_nonzero((self.csr.degree() > 0)
+                                & (self.node_data["attackable"].values == 1))
+        _, betweenness, error = self._betweenness(samples, seed, workers)
+        betweenness *= 1 / (size * (size - 1))
+        error *= 1 / (size * (size - 1))
+
+        betweenness = np.append(betweenness, 0.0)[self.csr.link_edge]
+        error = np.append(error, 0.0)[self.csr.link_edge]
+        # Normalise by the largest link, with the error of the ratio to
+        # its estimate propagated to first order:
+        top = np.argmax(betweenness)
+        scale = betweenness[top]
+        betweenness /= scale
+        error = np.hypot(error, betweenness * error[top]) / scale
+        # Remove round-off so that ties are bucketed consistently:
+        betweenness = np.round(betweenness, 12)
+        if return_error:
+            return (betweenness, error)
         return betweenness
 
     def articulation_points(self):
         """Find the articulation points of the topology."""
-        graph = self.get_graph_with_attackable_nodes()
-        return list(nx.articulation_points(graph))
+        if self._biconnected is None:
+            self._biconnected = self._create_biconnected()
+        else:
+            self._sync_attackable()
+        index = self.node_data.index
+        return list(index[index.isin(self._biconnected.articulation)])
+
+    def set_attackable(self, node, attackable):
+        """Set attackable flag of node.
+
+        Articulation points of the attackable subgraph are updated
+        incrementally.
+        """
+        self.node_data.at[node, "attackable"] = attackable
+        if self._biconnected is not None:
+            self._update_attackable(node, attackable == 1)
+
+    def _notify(self, method):
+        # Call the given method of the observers.
+        for observer in list(self._observers):
+            getattr(observer, method)()
+
+    def add_link(self, start_node, end_node, **data):
+        """Add link with attributes given for all columns of link_data.
+
+        The link is added to link_data when it is next used. Articulation
+        points are updated incrementally.
+        """
+        if start_node not in self.node_data.index \
+                or end_node not in self.node_data.index:
+            raise ValueError("links with unknown nodes")
+        link = (start_node, end_node)
+        row = [data[column] for column in self._link_data.columns]
+        self._notify("links_changing")
+        self._link_seq += 1
+        self._link_adds.append((self._link_seq, link, row))
+        self._link_pending[link] += 1
+        self._graph = None
+        if self._biconnected is not None and start_node != end_node:
+            self._adjacency[start_node][end_node] += 1
+            self._adjacency[end_node][start_node] += 1
+            labels = self.node_data.index
+            if self._attackable[labels.get_loc(start_node)] \
+                    and self._attackable[labels.get_loc(end_node)]:
+                self._biconnected.add_edge(start_node, end_node)
+        self._notify("links_changed")
+
+    def remove_link(self, start_node, end_node):
+        """Remove link from start_node to end_node.
+
+        The link is removed from link_data when it is next used.
+        Articulation points are updated incrementally.
+        """
+        link = (start_node, end_node)
+        count = self._count_links(link)
+        if count == 0:
+            raise KeyError(link)
+        self._notify("links_changing")
+        self._link_seq += 1
+        self._link_removed[link] = self._link_seq
+        self._link_pending[link] = 0
+        if link in self._link_data.index:
+            self._link_drops.add(link)
+        self._graph = None
+        if self._biconnected is not None and start_node != end_node:
+            adjacency = self._adjacency
+            adjacency[start_node][end_node] -= count
+            adjacency[end_node][start_node] -= count
+            if adjacency[start_node][end_node] == 0:
+                del adjacency[start_node][end_node]
+                del adjacency[end_node][start_node]
+                self._biconnected.remove_edge(start_node, end_node)
+        self._notify("links_changed")
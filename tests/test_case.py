@@ -6,13 +6,34 @@
 
 """Provides SNRAM test cases."""
 
+import asyncio
+import io
+import multiprocessing
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
+import pandas as pd
+import pyomo.environ as pe
+import scipy.sparse as sp
+from scipy.optimize import linprog
+from networkx import nx
 from snram.topology import NetworkTopology
+from snram.graph import CSRGraph, FlowNetwork
+from snram.network_risk import NetworkRisk
+from snram.risk_score import THREAT_MAX
+from snram.attacker import Attacker
+from snram.defender import Defender
 from snram.max_flow_interdict import MaxFlowInterdiction
 from snram.sp_interdict import SPInterdiction
 from snram.min_cost_flow_interdict import MinCostFlowInterdiction
+from snram.interdict import interdiction_sweep, heuristic_gap, \
+    criticality, od_interdiction, od_pairs
+from snram.solution_cache import SolutionCache
+from snram.solver import ModelSolver
+from snram.driver import driver
 
 
 class TestSNRAM(unittest.TestCase):
@@ -100,6 +121,666 @@ class TestSNRAM(unittest.TestCase):
         self.assertTrue(np.allclose(primal.OBJ(), ans[2], atol=0.001))
         self.assertTrue(np.allclose(idual.OBJ(), ans[2], atol=0.001))
 
+    def test_scipy_backend(self):
+        # Matrix-form models solved with SciPy (HiGHS) for test cases 1-3.
+        cases = [(MaxFlowInterdiction, "test_case1.xlsx", [80.0, 10.0, 0.0]),
+                 (SPInterdiction, "test_case2.xlsx", [5.0, 17.0, 100.0]),
+                 (MinCostFlowInterdiction, "test_case3.xlsx",
+                  [700.0, 7300.0, 21000.0])]
+
+        for interdiction, fname, ans in cases:
+            topology = NetworkTopology(os.path.join("tests", fname))
+            model = interdiction(topology, 0, "scipy")
+            for attack in range(3):
+                model.set_attacks(attack)
+                primal, idual = model.solve()
+
+                self.assertTrue(np.allclose(primal.OBJ(), ans[attack],
+                                            atol=0.001))
+                self.assertTrue(np.allclose(idual.OBJ(), ans[attack],
+                                            atol=0.001))
+                self.assertEqual(topology.link_data["xbar"].sum(), attack)
+
+    def test_combinatorial(self):
+        # Combinatorial max-flow interdiction must match the MILP.
+        for fname in [os.path.join("tests", "test_case1.xlsx"),
+                      os.path.join("examples", "max-flow.xlsx")]:
+            ans = interdiction_sweep(NetworkTopology(fname), "max-flow", 3,
+                                     "scipy")
+            res = interdiction_sweep(NetworkTopology(fname), "max-flow", 3,
+                                     "combinatorial")
+
+            self.assertTrue(np.allclose([r["primal"] for r in res],
+                                        [a["primal"] for a in ans]))
+            self.assertTrue(np.allclose([r["dual"] for r in res],
+                                        [a["dual"] for a in ans]))
+
+    def test_decomposition(self):
+        # Decomposition of shortest-path interdiction must match the MILP.
+        fname = os.path.join("tests", "test_case2.xlsx")
+        ans = [5.0, 17.0, 100.0, 100.0]
+
+        res = interdiction_sweep(NetworkTopology(fname), "shortest-path", 3,
+                                 "decomposition")
+
+        self.assertTrue(np.allclose([r["primal"] for r in res], ans))
+        self.assertTrue(np.allclose([r["dual"] for r in res], ans))
+        self.assertEqual([len(r["interdicted"]) for r in res][:2], [0, 1])
+
+    def test_interdiction_sweep(self):
+        # Parallel budget sweep must return the serial records in order.
+        fname = os.path.join("tests", "test_case3.xlsx")
+
+        ans = interdiction_sweep(NetworkTopology(fname), "min-cost-flow", 2,
+                                 "scipy")
+        res = interdiction_sweep(NetworkTopology(fname), "min-cost-flow", 2,
+                                 "scipy", workers=2)
+
+        self.assertEqual([r["attacks"] for r in res], [0, 1, 2])
+        self.assertEqual([r["interdicted"] for r in res],
+                         [a["interdicted"] for a in ans])
+        self.assertTrue(np.allclose([r["primal"] for r in res],
+                                    [700.0, 7300.0, 21000.0]))
+
+    def test_warmstart(self):
+        # Warm-started sweeps must find the optimal objectives.
+        for case, method in [(1, "max-flow"), (2, "shortest-path"),
+                             (3, "min-cost-flow")]:
+            fname = os.path.join("tests", "test_case%d.xlsx" % case)
+            ans = interdiction_sweep(NetworkTopology(fname), method, 3,
+                                     "scipy")
+            res = interdiction_sweep(NetworkTopology(fname), method, 3,
+                                     "scipy", warmstart=True)
+
+            self.assertTrue(np.allclose([r["dual"] for r in res],
+                                        [a["dual"] for a in ans]))
+            self.assertTrue(all(r["time"] >= 0.0 for r in res))
+
+    def test_native_primal(self):
+        # Native post-interdiction flows must match the primal LP.
+        for case, method in [(1, "max-flow"), (2, "shortest-path"),
+                             (3, "min-cost-flow")]:
+            fname = os.path.join("tests", "test_case%d.xlsx" % case)
+            ans = interdiction_sweep(NetworkTopology(fname), method, 3,
+                                     "scipy")
+            res = interdiction_sweep(NetworkTopology(fname), method, 3,
+                                     "scipy", native_primal=True)
+
+            self.assertTrue(np.allclose([r["primal"] for r in res],
+                                        [a["primal"] for a in ans]))
+            self.assertEqual([r["interdicted"] for r in res],
+                             [a["interdicted"] for a in ans])
+
+    def test_flow_network(self):
+        # Native flows must match the LP on a random network with
+        # fractional capacities.
+        rng = np.random.default_rng(7)
+        num_nodes, num_arcs = 400, 1200
+        start = rng.integers(0, num_nodes, num_arcs)
+        end = (start + rng.integers(1, num_nodes, num_arcs)) % num_nodes
+        # A ring in both directions keeps every node reachable:
+        ring = np.arange(num_nodes)
+        start = np.concatenate([start, ring, (ring + 1) % num_nodes])
+        end = np.concatenate([end, (ring + 1) % num_nodes, ring])
+        num_arcs = len(start)
+        capacity = rng.uniform(0.1, 10.0, num_arcs)
+        cost = rng.uniform(0.0, 5.0, num_arcs)
+        network = FlowNetwork(num_nodes, start, end, capacity)
+        incidence = sp.csr_matrix(
+            (np.concatenate([-np.ones(num_arcs), np.ones(num_arcs)]),
+             (np.concatenate([start, end]), np.tile(np.arange(num_arcs), 2))),
+            shape=(num_nodes, num_arcs))
+        bounds = list(zip(np.zeros(num_arcs), capacity))
+
+        value, flow, _ = network.max_flow(0, 1)
+        demand = np.zeros(num_nodes)
+        demand[[0, 1]] = [-value, value]
+        self.assertTrue(np.allclose(incidence @ flow, demand))
+        res = linprog(-(incidence[1].toarray().ravel()),
+                      A_eq=incidence[2:], b_eq=np.zeros(num_nodes - 2),
+                      bounds=bounds, method="highs")
+        self.assertAlmostEqual(value, -res.fun, places=6)
+
+        supply_demand = np.zeros(num_nodes)
+        supply_demand[:10] = -rng.uniform(0.05, 0.2, 10)
+        supply_demand[10:20] = rng.uniform(0.05, 0.2, 10)
+        supply_demand[10:20] *= -supply_demand[:10].sum() \
+            / supply_demand[10:20].sum()
+        flow = network.min_cost_flow(cost, supply_demand)
+        self.assertTrue(np.allclose(incidence @ flow, supply_demand))
+        res = linprog(cost, A_eq=incidence, b_eq=supply_demand,
+                      bounds=bounds, method="highs")
+        self.assertEqual(res.status, 0)
+        self.assertAlmostEqual(cost @ flow, res.fun, places=6)
+        self.assertLessEqual(network.augmentations, num_arcs + 20)
+
+    def test_solution_cache(self):
+        # Cached solutions must reproduce the solved records.
+        fname = os.path.join("tests", "test_case3.xlsx")
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = SolutionCache(cache_dir)
+            ans = interdiction_sweep(NetworkTopology(fname), "min-cost-flow",
+                                     2, "scipy", cache=cache)
+            topology = NetworkTopology(fname)
+            res = interdiction_sweep(topology, "min-cost-flow", 2, "scipy",
+                                     cache=cache)
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+
+            for r, a in zip(res, ans):
+                self.assertEqual(r["interdicted"], a["interdicted"])
+                self.assertEqual(r["flows"], a["flows"])
+                self.assertTrue(np.allclose([r["primal"], r["dual"]],
+                                            [a["primal"], a["dual"]]))
+            self.assertEqual(topology.link_data["xbar"].sum(), 2)
+
+            # Least recently used solutions are evicted:
+            size = os.path.getsize(os.path.join(cache_dir,
+                                                os.listdir(cache_dir)[0]))
+            SolutionCache(cache_dir, 2 * size)
+            self.assertLessEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_result(self):
+        # Result arrays must match the solution record.
+        topology = NetworkTopology(os.path.join("tests", "test_case3.xlsx"))
+        model = MinCostFlowInterdiction(topology, 2, "scipy")
+        model.solve()
+        result = model.result()
+        record = model.solution()
+
+        links = result.to_frame()
+        self.assertEqual(list(links.index), list(topology.link_set))
+        self.assertTrue(np.allclose(links["flow"],
+                                    [flow for _, flow in record["flows"]]))
+        self.assertEqual(links["xbar"].sum(), 2)
+        self.assertEqual(result.interdicted(), record["interdicted"])
+
+        nodes = result.to_frame("nodes")
+        self.assertEqual(nodes.loc[record["unsat_supply"][0][0],
+                                   "unsat_supply"],
+                         record["unsat_supply"][0][1])
+        self.assertEqual(len(result.to_records("nodes")), len(nodes))
+        self.assertRaises(KeyError, result.to_frame, "edges")
+
+    def test_criticality(self):
+        # The most critical link is the optimal single interdiction, and
+        # its criticality is the loss of the objective.
+        expected = {1: (("Source", "C"), 10.0), 2: (("B", "Target"), 17.0),
+                    3: (("Source", "C"), 7300.0)}
+        for case, method in [(1, "max-flow"), (2, "shortest-path"),
+                             (3, "min-cost-flow")]:
+            fname = os.path.join("tests", "test_case%d.xlsx" % case)
+            link, primal = expected[case]
+            res = interdiction_sweep(NetworkTopology(fname), method, 1,
+                                     "scipy")
+            self.assertEqual(res[1]["interdicted"], [link])
+            self.assertTrue(np.isclose(res[1]["primal"], primal))
+
+            ranking = criticality(NetworkTopology(fname), method)
+            self.assertEqual(ranking.index[0], link)
+            self.assertTrue(np.isclose(
+                abs(res[0]["primal"] - primal),
+                ranking["criticality"].iloc[0]))
+            self.assertTrue(ranking["criticality"].is_monotonic_decreasing)
+
+    def test_greedy(self):
+        # Greedy interdiction is optimal for the small test cases.
+        for case, method in [(1, "max-flow"), (2, "shortest-path"),
+                             (3, "min-cost-flow")]:
+            fname = os.path.join("tests", "test_case%d.xlsx" % case)
+            topology = NetworkTopology(fname)
+            res = heuristic_gap(topology, method, 1, "scipy")
+
+            self.assertTrue(np.allclose([r["gap"] for r in res], 0.0))
+            self.assertEqual(topology.link_data["xbar"].sum(), 1)
+
+    def test_incumbents(self):
+        # The last incumbent passed to the callback is the solution.
+        fname = os.path.join("tests", "test_case1.xlsx")
+        for solver in ["scipy", "combinatorial", "greedy"]:
+            incumbents = []
+            model = MaxFlowInterdiction(fname, 1, solver, time_limit=60,
+                                        mip_gap=0.0,
+                                        callback=incumbents.append)
+            model.solve()
+            sol = model.solution()
+
+            self.assertTrue(incumbents)
+            self.assertEqual(incumbents[-1]["interdicted"], sol["interdicted"])
+            self.assertAlmostEqual(incumbents[-1]["objective"], sol["dual"])
+            self.assertAlmostEqual(sol["dual"], 10.0)
+
+        # Without highspy callbacks only the solution is passed on:
+        incumbents = []
+        with mock.patch("snram.matrix_model._HIGHS_CALLBACKS", False):
+            MaxFlowInterdiction(fname, 1, "scipy",
+                                callback=incumbents.append).solve()
+        self.assertEqual(len(incumbents), 1)
+        self.assertAlmostEqual(incumbents[0]["objective"], 10.0)
+
+    def test_od_interdiction(self):
+        # Batch max-flow interdiction over OD pairs (list or matrix).
+        topology = NetworkTopology(os.path.join("tests", "test_case1.xlsx"))
+        ans = [[80.0, 70.0], [10.0, 30.0], [0.0, 0.0]]
+
+        od = pd.DataFrame(0, index=["Source", "C"], columns=["Target", "D"])
+        od.loc[["Source", "C"], "Target"] = 1
+        for solver in ["scipy", "combinatorial"]:
+            table, _ = od_interdiction(topology, od, 2, solver)
+            self.assertTrue(np.allclose(table.values, ans))
+
+        pairs = [("Source", "Target"), ("C", "Target")]
+        table, records = od_interdiction(topology, pairs, 2, "scipy",
+                                         workers=2)
+        self.assertEqual(list(table.columns), pairs)
+        self.assertTrue(np.allclose(table.values, ans))
+        self.assertEqual([len(r["interdicted"])
+                          for r in records[("C", "Target")]], [0, 1, 2])
+
+        # The OD file is checked before the topology is loaded:
+        with self.assertRaisesRegex(AttributeError, "no OD file"):
+            driver(os.path.join("tests", "missing.xlsx"), run_type="od")
+
+    def test_solve_async(self):
+        # Concurrent solves in subprocesses must match the solves.
+        models = [MaxFlowInterdiction(os.path.join("tests", "test_case1.xlsx"),
+                                      1, "scipy"),
+                  SPInterdiction(os.path.join("tests", "test_case2.xlsx"),
+                                 1, "scipy"),
+                  MinCostFlowInterdiction(
+                      os.path.join("tests", "test_case3.xlsx"), 1, "scipy")]
+
+        async def solve_all():
+            return await asyncio.gather(*(m.solve_async() for m in models))
+
+        res = asyncio.run(solve_all())
+        self.assertTrue(np.allclose([p.OBJ() for p, _ in res],
+                                    [10.0, 17.0, 7300.0]))
+        self.assertTrue(np.allclose([d.OBJ() for _, d in res],
+                                    [10.0, 17.0, 7300.0]))
+        for model in models:
+            self.assertEqual(len(model.solution()["interdicted"]), 1)
+
+        with self.assertRaises(asyncio.TimeoutError):
+            asyncio.run(models[0].solve_async(timeout=0.0))
+        self.assertFalse(multiprocessing.active_children())
+
+        # Under spawn the models, also Pyomo models, are built in the
+        # subprocess:
+        solvers = ["scipy"]
+        if pe.SolverFactory("appsi_highs").available(False):
+            solvers.append("appsi_highs")
+        for solver in solvers:
+            incumbents = []
+            model = MaxFlowInterdiction(
+                os.path.join("tests", "test_case1.xlsx"), 1, solver,
+                warmstart=True, callback=incumbents.append)
+            asyncio.run(model.solve_async(
+                context=multiprocessing.get_context("spawn")))
+            sol = model.solution()
+            self.assertEqual(sol["interdicted"], [("Source", "C")])
+            self.assertAlmostEqual(sol["dual"], 10.0)
+            self.assertAlmostEqual(incumbents[-1]["objective"], 10.0)
+
+    def test_attacker(self):
+        # Incremental attacker must reproduce the brute-force greedy choices.
+        fname = os.path.join("examples", "max-flow.xlsx")
+        budget = 12
+
+        for asset in ["nodes", "links"]:
+            attacker = Attacker(fname, budget, incremental=False)
+            ans, _ = attacker.maximise_threat(asset)
+
+            attacker = Attacker(fname, budget)
+            res, _ = attacker.maximise_threat(asset)
+
+            self.assertTrue(np.allclose(res, ans))
+
+    def test_defender(self):
+        # Heap-indexed defender must reproduce the greedy choices.
+        fname = os.path.join("examples", "max-flow.xlsx")
+        budget = 12
+
+        for method in ["minimise_vulnerability", "minimise_consequence"]:
+            defender = Defender(fname, budget, incremental=False)
+            ans, _ = getattr(defender, method)("links")
+
+            defender = Defender(fname, budget)
+            res, _ = getattr(defender, method)("links")
+
+            self.assertEqual([r[0] for r in res], [a[0] for a in ans])
+            self.assertTrue(np.allclose([r[1:] for r in res],
+                                        [a[1:] for a in ans]))
+
+    def test_scenarios(self):
+        # Batched what-if evaluation must not modify the topology.
+        fname = os.path.join("examples", "max-flow.xlsx")
+        network_risk = NetworkRisk(fname)
+        link_data = network_risk.topology.link_data.copy()
+
+        vuln = network_risk.get_vulnerability("links")
+        vuln = np.array([vuln, np.maximum(vuln - 1, 1), np.full_like(vuln, 5)])
+        risk, risk_sum, critical = network_risk.evaluate_scenarios(
+            "links", vuln=vuln, top_k=2)
+
+        self.assertTrue(network_risk.topology.link_data.equals(link_data))
+        self.assertEqual(risk.shape, vuln.shape)
+        self.assertTrue(np.allclose(risk[0], network_risk.get_risk("links")))
+        self.assertTrue(np.allclose(risk_sum, risk.sum(axis=1)))
+        for i in range(len(vuln)):
+            network_risk.set_vulnerability("links", vuln[i])
+            idx, _ = network_risk.find_critical_index("links", "risk")
+            self.assertEqual(critical[i][0], idx)
+
+    def test_topology_cache(self):
+        # Cached topologies are reused until the Excel file changes.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_dir = os.path.join(tmp_dir, "cache")
+            fname = os.path.join(tmp_dir, "max-flow.xlsx")
+            sheets = pd.read_excel(os.path.join("examples", "max-flow.xlsx"),
+                                   sheet_name=["nodes", "links"])
+            with pd.ExcelWriter(fname) as writer:  # pylint: disable=abstract-class-instantiated
+                for name, sheet in sheets.items():
+                    sheet.to_excel(writer, sheet_name=name, index=False)
+            ans = NetworkTopology(fname, cache_dir)
+            cache_files = os.listdir(cache_dir)
+            self.assertEqual(len(cache_files), 1)
+
+            # A repeat load reads the cache and not the Excel file:
+            with mock.patch("pandas.read_excel", side_effect=AssertionError):
+                res = NetworkTopology(fname, cache_dir)
+            self.assertTrue(res.link_data.equals(ans.link_data))
+            self.assertTrue(np.array_equal(res.csr.indices, ans.csr.indices))
+
+            # Editing the workbook replaces the cache file:
+            sheets["links"]["capacity"] *= 2
+            with pd.ExcelWriter(fname) as writer:  # pylint: disable=abstract-class-instantiated
+                for name, sheet in sheets.items():
+                    sheet.to_excel(writer, sheet_name=name, index=False)
+            res = NetworkTopology(fname, cache_dir)
+            self.assertTrue(np.allclose(res.link_data["capacity"], 200))
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertNotIn(cache_files[0], os.listdir(cache_dir))
+
+            # A corrupt cache falls back to the Excel file:
+            cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+            for content in [b"corrupt", b"\x80\x04K\x01."]:
+                with open(cache_file, "wb") as f:
+                    f.write(content)
+                res = NetworkTopology(fname, cache_dir)
+                self.assertTrue(np.allclose(res.link_data["capacity"], 200))
+
+            # Files with the same name in other directories are cached apart:
+            other_dir = os.path.join(tmp_dir, "other")
+            os.makedirs(other_dir)
+            shutil.copy(fname, other_dir)
+            NetworkTopology(os.path.join(other_dir, "max-flow.xlsx"), cache_dir)
+            NetworkTopology(fname, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+
+    def test_load_csv(self):
+        # Chunked CSV loads must match the Excel loads.
+        numeric = {"nodes": pd.DataFrame({"node": [1, 2, 3],
+                                          "attackable": [1, 1, 1]}),
+                   "links": pd.DataFrame({"start_node": [1, 2, 3],
+                                          "end_node": [2, 3, 1],
+                                          "capacity": [10, 20, 30]})}
+        named = pd.read_excel(os.path.join("examples", "max-flow.xlsx"),
+                              sheet_name=["nodes", "links"])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            nodes_file = os.path.join(tmp_dir, "nodes.csv")
+            links_file = os.path.join(tmp_dir, "links.csv")
+            for sheets in [named, numeric]:
+                fname = os.path.join(tmp_dir, "topology.xlsx")
+                with pd.ExcelWriter(fname) as writer:  # pylint: disable=abstract-class-instantiated
+                    for name, sheet in sheets.items():
+                        sheet.to_excel(writer, sheet_name=name, index=False)
+                sheets["nodes"].to_csv(nodes_file, index=False)
+                sheets["links"].to_csv(links_file, index=False)
+
+                ans = NetworkTopology(fname)
+                res = NetworkTopology()
+                res.load_csv(links_file, nodes_file, chunksize=2)
+                self.assertEqual(list(res.node_set), list(ans.node_set))
+                self.assertTrue(res.link_data.index.equals(
+                    ans.link_data.index))
+                self.assertEqual(list(res.link_set), list(ans.link_set))
+                for attr in ["indptr", "indices", "edge_ids", "link_edge"]:
+                    self.assertTrue(np.array_equal(getattr(res.csr, attr),
+                                                   getattr(ans.csr, attr)))
+
+            # OD labels read as strings are matched to numeric nodes:
+            od = pd.read_csv(io.StringIO("node,3\n1,1\n"), index_col=0)
+            self.assertEqual(od_pairs(od, res.node_data.index), [(1, 3)])
+
+            # Links with unknown nodes and duplicate nodes are rejected:
+            numeric["links"].iloc[1:].to_csv(links_file, index=False)
+            numeric["nodes"].iloc[1:].to_csv(nodes_file, index=False)
+            self.assertRaises(ValueError, NetworkTopology().load_csv,
+                              links_file, nodes_file, chunksize=2)
+            for duplicate in [1, "01"]:
+                nodes = numeric["nodes"].copy()
+                nodes.loc[len(nodes)] = [duplicate, 1]
+                nodes.to_csv(nodes_file, index=False)
+                self.assertRaises(ValueError, NetworkTopology().load_csv,
+                                  links_file, nodes_file, chunksize=2)
+
+    def test_centrality(self):
+        # CSR centralities must match NetworkX on the attackable subgraph.
+        def normalised(values, keys):
+            values = np.array([values.get(key, 0.0) for key in keys])
+            return values / np.max(values)
+
+        for fname in ["max-flow.xlsx", "shortest-path.xlsx"]:
+            topology = NetworkTopology(os.path.join("examples", fname))
+            for node in [None] + list(topology.node_data.index):
+                if node is not None:
+                    topology.set_attackable(node, 0)
+                graph = topology.get_graph_with_attackable_nodes()
+                nodes = topology.node_data.index
+                edge_bc = nx.edge_betweenness_centrality(graph)
+                links = [link if link in edge_bc else link[::-1]
+                         for link in topology.link_data.index]
+
+                self.assertTrue(np.allclose(
+                    topology.node_degree_centrality(),
+                    normalised(nx.degree_centrality(graph), nodes)))
+                self.assertTrue(np.allclose(
+                    topology.node_betweenness_centrality(),
+                    normalised(nx.betweenness_centrality(graph), nodes)))
+                self.assertTrue(np.allclose(
+                    topology.link_betweenness_centrality(),
+                    normalised(edge_bc, links)))
+                self.assertEqual(
+                    topology.articulation_points(),
+                    list(nodes[nodes.isin(nx.articulation_points(graph))]))
+                if node is not None:
+                    topology.set_attackable(node, 1)
+
+        # Long paths and cycles (high diameter) in small batches:
+        for graph in [nx.path_graph(300), nx.cycle_graph(301)]:
+            edges = np.array(graph.edges).T
+            csr = CSRGraph(len(graph), edges[0], edges[1])
+            node_bc, edge_bc = csr.betweenness(batch_size=16)
+            ans = nx.betweenness_centrality(graph, normalized=False)
+            self.assertTrue(np.allclose(node_bc / 2, [ans[n] for n in graph]))
+            ans = nx.edge_betweenness_centrality(graph, normalized=False)
+            ans = [ans[tuple(edge)] for edge in csr.edge_nodes.T]
+            self.assertTrue(np.allclose(edge_bc / 2, ans))
+
+    def test_sampled_betweenness(self):
+        # Sampled link betweenness must be reproducible and within its error.
+        graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(8, 8))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            links_file = os.path.join(tmp_dir, "links.csv")
+            pd.DataFrame(list(graph.edges), columns=["start_node", "end_node"]
+                         ).to_csv(links_file, index=False)
+            topology = NetworkTopology()
+            topology.load_csv(links_file)
+        ans = topology.link_betweenness_centrality()
+
+        for seed in range(5):
+            res, error = topology.link_betweenness_centrality(
+                32, seed, return_error=True)
+            again = topology.link_betweenness_centrality(
+                32, seed, return_error=True)
+            self.assertTrue(np.array_equal(res, again[0]))
+            self.assertTrue(np.array_equal(error, again[1]))
+            self.assertTrue((error > 0).all())
+            self.assertTrue((np.abs(res - ans) <= 4 * error).all())
+
+        res, error = topology.link_betweenness_centrality(
+            len(graph), 0, return_error=True)
+        self.assertTrue(np.allclose(res, ans))
+        self.assertTrue((error == 0).all())
+
+        # Threat errors are given in threat levels:
+        network_risk = NetworkRisk(topology, samples=32, seed=0)
+        network_risk.get_threat("links")
+        _, error = topology.link_betweenness_centrality(
+            32, 0, return_error=True)
+        self.assertAlmostEqual(network_risk.link_threat_error,
+                               np.max(error) * THREAT_MAX)
+
+    def test_parallel_betweenness(self):
+        # Betweenness computed by worker processes must match the serial one.
+        graph = nx.convert_node_labels_to_integers(nx.grid_2d_graph(6, 6))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            links_file = os.path.join(tmp_dir, "links.csv")
+            pd.DataFrame(list(graph.edges), columns=["start_node", "end_node"]
+                         ).to_csv(links_file, index=False)
+            topology = NetworkTopology()
+            topology.load_csv(links_file)
+
+        for samples, seed in [(None, None), (12, 1)]:
+            ans = topology.node_betweenness_centrality(samples, seed)
+            res = topology.node_betweenness_centrality(samples, seed,
+                                                       workers=2)
+            self.assertTrue(np.allclose(res, ans))
+
+            ans = topology.link_betweenness_centrality(
+                samples, seed, return_error=True)
+            res = topology.link_betweenness_centrality(
+                samples, seed, return_error=True, workers=2)
+            self.assertTrue(np.allclose(res, ans))
+
+    def test_solver_options(self):
+        # Cutoffs must map to the option names and signs of the solvers.
+        def model(sense):
+            m = pe.ConcreteModel()
+            m.x = pe.Var(domain=pe.NonNegativeIntegers, bounds=(0, 3))
+            m.y = pe.Var(domain=pe.NonNegativeIntegers, bounds=(0, 3))
+            m.c = pe.Constraint(expr=m.x + 2 * m.y <= 4)
+            m.obj = pe.Objective(expr=m.x + m.y, sense=sense)
+            return m
+
+        ans = [("cplex", pe.minimize, "mip_tolerances_uppercutoff", 2.0),
+               ("cplex", pe.maximize, "mip_tolerances_lowercutoff", 2.0),
+               ("gurobi", pe.minimize, "Cutoff", 2.0),
+               ("gurobi", pe.maximize, "Cutoff", 2.0),
+               ("appsi_highs", pe.minimize, "objective_bound", 2.0),
+               ("appsi_highs", pe.maximize, "objective_bound", -2.0),
+               ("glpk", pe.minimize, None, None)]
+        for solver, sense, option, value in ans:
+            res = ModelSolver(model(sense), solver)
+            self.assertEqual(res._find_cutoff_option(solver), option)  # pylint: disable=protected-access
+            res._set_cutoff(2.0)  # pylint: disable=protected-access
+            if option is None:
+                self.assertFalse(res.solver.options)
+            else:
+                self.assertAlmostEqual(res.solver.options[option], value,
+                                       places=5)
+                res._set_cutoff(None)  # pylint: disable=protected-access
+                self.assertEqual(res.solver.options.get(option, np.inf),
+                                 np.inf)
+
+    @unittest.skipUnless(pe.SolverFactory("appsi_highs").available(False),
+                         "HiGHS is not available")
+    def test_highs_cutoff(self):
+        # HiGHS must keep solutions of a maximisation model above the cutoff.
+        m = pe.ConcreteModel()
+        m.x = pe.Var(domain=pe.NonNegativeIntegers, bounds=(0, 3))
+        m.y = pe.Var(domain=pe.NonNegativeIntegers, bounds=(0, 3))
+        m.c = pe.Constraint(expr=m.x + 2 * m.y <= 4)
+        m.obj = pe.Objective(expr=m.x + m.y, sense=pe.maximize)
+        ModelSolver(m, "appsi_highs").solve(cutoff=3.0)
+        self.assertAlmostEqual(pe.value(m.obj), 3.0)
+        self.assertRaises(RuntimeError, ModelSolver(m, "appsi_highs").solve,
+                          cutoff=3.5)
+
+    def test_articulation_points(self):
+        # Incremental articulation points must match a full recomputation.
+        fname = os.path.join("examples", "shortest-path.xlsx")
+        topology = NetworkTopology(fname)
+
+        def full(topology):
+            graph = topology.get_graph_with_attackable_nodes()
+            index = topology.node_data.index
+            return list(index[index.isin(nx.articulation_points(graph))])
+
+        self.assertEqual(topology.articulation_points(), full(topology))
+        for node in topology.node_data.index:
+            topology.set_attackable(node, 0)
+            self.assertEqual(topology.articulation_points(), full(topology))
+            topology.set_attackable(node, 1)
+        for link in list(topology.link_data.index):
+            data = topology.link_data.loc[link].to_dict()
+            topology.remove_link(*link)
+            self.assertEqual(topology.articulation_points(), full(topology))
+            topology.add_link(*link, **data)
+            self.assertEqual(topology.articulation_points(), full(topology))
+
+        # Attackable flags written directly to the frame are picked up:
+        topology.node_data["attackable"] = 1
+        topology.node_data.iloc[1, topology.node_data.columns.get_loc(
+            "attackable")] = 0
+        self.assertEqual(topology.articulation_points(), full(topology))
+
+    def test_topology_updates(self):
+        # Queued link changes must reach the frames, CSR and risk vectors.
+        fname = os.path.join("examples", "shortest-path.xlsx")
+        topology = NetworkTopology(fname)
+        network_risk = NetworkRisk(topology)
+        topology.articulation_points()
+        links = list(topology.link_data.index)
+        data = [topology.link_data.loc[link].to_dict() for link in links[:2]]
+
+        # Risk vectors modified before the changes are kept:
+        vuln = network_risk.get_vulnerability("links")
+        vuln[-1] = 5
+        network_risk.set_vulnerability("links", vuln)
+        topology.remove_link(*links[0])
+        topology.remove_link(*links[1])
+        topology.add_link(*links[0], **data[0])
+        topology.add_link(*links[1][::-1], **data[1])
+        self.assertRaises(KeyError, topology.remove_link, *links[1])
+
+        ans = links[2:] + [links[0], links[1][::-1]]
+        self.assertEqual(list(topology.link_data.index), ans)
+        self.assertEqual(list(topology.link_set), ans)
+        self.assertEqual(network_risk.get_vulnerability("links")[-3], 5)
+        self.assertEqual(len(network_risk.get_risk("links")), len(ans))
+        network_risk.sync()
+        self.assertTrue(np.array_equal(topology.link_data["risk"],
+                                       network_risk.get_risk("links")))
+
+        fresh = NetworkTopology()
+        fresh.node_data = topology.node_data
+        fresh.link_data = topology.link_data.copy()
+        for attr in ["indptr", "indices", "edge_ids", "link_edge"]:
+            self.assertTrue(np.array_equal(getattr(topology.csr, attr),
+                                           getattr(fresh.csr, attr)))
+        self.assertEqual(topology.articulation_points(),
+                         fresh.articulation_points())
+
+        # Attackable flags are read from the topology:
+        node = topology.node_data.index[1]
+        topology.set_attackable(node, 0)
+        self.assertEqual(network_risk.get_attackable("nodes")[1], 0)
+        idx, _ = network_risk.find_critical_index("nodes", "risk")
+        self.assertNotEqual(idx, 1)
+
 
 if __name__ == "__main__":
     unittest.main()